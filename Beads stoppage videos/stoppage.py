@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Pressure actuation videos + codes"))
+from framesource import FrameSource
+
+# === Settings ===
+SCALE = 0.25      # downsampling of the grayscale frames
+SMOOTH = 5        # frames in the moving average of the motion energy
+MIN_CONTRAST = 1.5 # flow/rest energy ratio (90th/10th percentile) below which nothing stops
+MIN_DWELL = 0.1   # s a new state has to last before the event counts
+
+# ========== Frame Rate ==========
+# Raw Annex-B .264 streams carry no timing; decoders report a made-up 25 fps
+# for them. The camera also saves an .H264 (MP4) copy of the same recording,
+# whose container rate is used instead, otherwise fps must be given.
+def annexb(path):
+    with open(path, 'rb') as f: head = f.read(4)
+    return head == b'\0\0\0\1' or head[:3] == b'\0\0\1'
+
+def container_fps(path):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps == fps else None
+
+def video_fps(video_path, fps=None):
+    if fps: return fps
+    if not annexb(video_path):
+        fps = container_fps(video_path)
+        if fps: return fps
+    folder, name = os.path.split(os.path.abspath(video_path))
+    stem = os.path.splitext(name)[0].lower()
+    for f in sorted(os.listdir(folder)):
+        twin = os.path.join(folder, f)
+        if f == name or os.path.splitext(f)[0].lower() != stem or annexb(twin): continue
+        fps = container_fps(twin)
+        if fps:
+            print(f"{name}: using {fps:.2f} fps from {f}")
+            return fps
+    raise ValueError(f"{name} has no frame rate of its own, pass --fps")
+
+# ========== Motion Energy (single streaming pass) ==========
+def motion_energy(video_path, roi=None, scale=SCALE, stride=1, fps=None):
+    # roi: (x, y, w, h) of the channel region in full-resolution pixels.
+    # Returns frame times (s), mean absolute frame difference and the fps.
+    fps = video_fps(video_path, fps)
+    src = FrameSource(video_path, box=roi)
+    # two downsampled buffers swapped every frame
+    prev, cur = None, None
+    times, energy = [], []
+    for idx, gray in src:
+        if idx % stride: continue
+        cur = cv2.resize(gray, None, cur, scale, scale, interpolation=cv2.INTER_AREA)
+        if prev is not None:
+            energy.append(cv2.absdiff(cur, prev).mean())
+            times.append(idx / fps)
+        prev, cur = cur, prev
+    src.close()
+    return np.array(times), np.array(energy), fps
+
+# ========== Event Detection with Hysteresis ==========
+def detect_events(times, energy, low=None, high=None, smooth=SMOOTH, min_contrast=MIN_CONTRAST, min_dwell=MIN_DWELL):
+    # thresholds default to the trace's own 10/90 percentiles; a trace
+    # without min_contrast between them (continuous flow, or rest only) is
+    # sensor noise and gives no events
+    e = np.convolve(energy, np.ones(smooth)/smooth, mode='same') if smooth > 1 else energy
+    lo_p, hi_p = np.percentile(e, [10, 90])
+    auto = low is None and high is None
+    if low is None: low = lo_p + 0.3*(hi_p - lo_p)
+    if high is None: high = lo_p + 0.6*(hi_p - lo_p)
+    events = []
+    if auto and hi_p < min_contrast*lo_p:
+        return pd.DataFrame(events, columns=["Event", "Time (s)", "Latency (ms)"]), e, (low, high)
+    # a crossing only counts if the energy stays past the band for min_dwell
+    dwell = max(int(np.ceil(min_dwell / np.median(np.diff(times)))), 1) if len(times) > 1 else 1
+    moving = e[0] > low
+    last_high, last_low = (0 if moving else None), (None if moving else 0)
+    for i in range(len(e)):
+        if moving:
+            if e[i] >= high: last_high = i
+            elif e[i] < low and (e[i:i+dwell] < low).all():
+                # stop: closing latency is the fall from full flow to rest
+                t0 = times[last_high] if last_high is not None else times[i]
+                events.append({"Event": "stop", "Time (s)": times[i], "Latency (ms)": (times[i]-t0)*1000})
+                moving, last_low = False, i
+        else:
+            if e[i] <= low: last_low = i
+            elif e[i] > high and (e[i:i+dwell] > high).all():
+                t0 = times[last_low] if last_low is not None else times[i]
+                events.append({"Event": "restart", "Time (s)": times[i], "Latency (ms)": (times[i]-t0)*1000})
+                moving, last_high = True, i
+    return pd.DataFrame(events, columns=["Event", "Time (s)", "Latency (ms)"]), e, (low, high)
+
+def command_latency(events, commands):
+    # commands: valve close/open command times (s); latency from the last
+    # command before each event
+    commands = np.sort(np.asarray(commands, dtype=float))
+    k = np.searchsorted(commands, events["Time (s)"].values, side='right') - 1
+    lat = np.where(k >= 0, (events["Time (s)"].values - commands[np.maximum(k, 0)])*1000, np.nan)
+    return events.assign(**{"Command Latency (ms)": lat})
+
+def analyse(video_path, roi=None, commands=None, output=None, fps=None):
+    t = time.time()
+    times, energy, fps = motion_energy(video_path, roi, fps=fps)
+    elapsed = time.time() - t
+    events, _, (low, high) = detect_events(times, energy)
+    if commands is not None: events = command_latency(events, commands)
+    print(f"{os.path.basename(video_path)}: {len(times)+1} frames in {elapsed:.1f}s "
+          f"({(len(times)+1)/fps/max(elapsed, 1e-9):.1f}x real time), thresholds {low:.2f}/{high:.2f}")
+    if events.empty: print("  no stop/restart events")
+    for ev, grp in events.groupby("Event"):
+        print(f"  {ev:8s} n={len(grp)}  latency {grp['Latency (ms)'].mean():.1f} ± {grp['Latency (ms)'].std():.1f} ms")
+    if output: events.to_excel(output, index=False)
+    return events
+
+if __name__ == '__main__':
+    # stoppage.py [--fps N] [--roi x y w h] [video ...]; by default every
+    # .264 here (the .H264 files are the same recordings)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fps', type=float, help="frame rate of the recordings (needed for .264 without an .H264 twin)")
+    parser.add_argument('--roi', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'), help="channel region in full-resolution pixels")
+    parser.add_argument('videos', nargs='*')
+    args = parser.parse_args()
+    names = args.videos or [f for f in sorted(os.listdir('.')) if f.lower().endswith('.264')]
+    for name in names:
+        try:
+            fps = video_fps(name, args.fps)
+        except ValueError as err:
+            if args.videos: raise
+            print(f"[SKIP] {err}")
+            continue
+        analyse(name, roi=args.roi, output=os.path.splitext(name)[0] + "_events.xlsx", fps=fps)
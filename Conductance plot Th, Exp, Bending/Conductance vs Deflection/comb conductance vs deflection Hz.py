@@ -1,101 +1,50 @@
-import cv2
 import numpy as np
 import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
 from scipy.interpolate import interp1d
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Pressure actuation videos + codes"))
+from spectral import response_table
+from roi import as_rois, select_rois, measure_rois, measure_adaptive
+import decimate
+
 # === Settings ===
 base_dir = "G:\\"
 video_filename = "8k device 0.5bar 0.5Hz 1000ms half a cycle.h264"
 resistance_file = os.path.join(base_dir, "08b1hz.xlsx")
 output_excel = os.path.join(base_dir, "conductance_vs_deflection_25to30s.xlsx")
 output_pdf = os.path.join(base_dir, "conductance_vs_deflection_25to30s.pdf")
+output_full_pdf = os.path.join(base_dir, "deflection_full_plot.pdf")
+output_response = os.path.join(base_dir, "frequency_response.xlsx")
 VIDEO_FPS = 300
 
-# === ROI variables ===
-state = 0
-p1 = p2 = p3 = p4 = None
-
-def get_size(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 220, 255, 0)
-    if abs(p3[1] - p4[1]) < abs(p3[0] - p4[0]):
-        y0 = int(((p3[1] - p2[1]) + (p4[1] - p2[1])) / 2)
-        x0 = int((p4[0] - p3[0]) / 2)
-        row = thresh[y0]
-        x1 = x2 = x0
-        while x1 > 0 and row[x1] == 0: x1 -= 1
-        while x2 < len(row) - 1 and row[x2] == 0: x2 += 1
-        return x2 - x1
-    else:
-        x0 = abs(int(((p3[0] - p1[0]) + (p4[0] - p1[0])) / 2))
-        y0 = abs(int((p4[1] - p3[1]) / 2))
-        col = thresh[:, x0]
-        y1 = y2 = y0
-        while y1 > 0 and col[y1] == 0: y1 -= 1
-        while y2 < len(col) - 1 and col[y2] == 0: y2 += 1
-        return abs(y2 - y1)
-
-def select_roi(video_path):
-    global state, p1, p2, p3, p4
-    cap = cv2.VideoCapture(video_path)
-    cv2.namedWindow("Frame", cv2.WINDOW_NORMAL)
-
-    def mouse_callback(event, x, y, flags, userdata):
-        global state, p1, p2, p3, p4
-        if event == cv2.EVENT_LBUTTONUP:
-            if state == 0: p1 = (x, y)
-            elif state == 1: p2 = (x, y)
-            elif state == 2: p3 = (x, y)
-            elif state == 3: p4 = (x, y)
-            state += 1
-        elif event == cv2.EVENT_RBUTTONUP:
-            p1 = p2 = p3 = p4 = None
-            state = 0
-
-    cv2.setMouseCallback("Frame", mouse_callback)
-
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret or state > 3: break
-        cv2.imshow("Frame", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'): break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    return p1, p2, p3, p4
-
-def get_deflection(video_path, fps):
-    p1, p2, p3, p4 = select_roi(video_path)
-    if not all([p1, p2, p3, p4]):
+def get_deflection(video_path, fps, rois=None, mode='scan', stride=1, tol=1):
+    # one ROI gives a 1-D series, several ROIs an (N, n_rois) array measured
+    # from the same decoded frames; mode 'area' adds a last axis of
+    # (area, centroid x, centroid y, extent). stride > 1 measures the scan
+    # line adaptively and interpolates flat stretches (error <= tol px)
+    rois = as_rois(rois) or select_rois(video_path, 1)
+    if not rois:
         print("[ERROR] ROI not set.")
         return [], []
 
-    cap = cv2.VideoCapture(video_path)
-    deflections = []
-    timestamps = []
-
-    frame_idx = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret: break
-        crop = frame[p2[1]:p1[1]+1, p1[0]:p2[0]+1]
-        d = get_size(crop)
-        deflections.append(d)
-        timestamps.append(frame_idx / fps)
-        frame_idx += 1
-
-    cap.release()
-    return np.array(timestamps), np.array(deflections)
+    if stride > 1 and mode == 'scan':
+        framenos, deflections, measured = measure_adaptive(video_path, rois, start=0, stride=stride, tol=tol)
+        print(f"[ADAPTIVE] measured {measured.sum()} of {len(measured)} frames")
+    else:
+        framenos, deflections = measure_rois(video_path, rois, start=0, mode=mode)
+    timestamps = (framenos - 1) / fps
+    return timestamps, deflections[:, 0] if len(rois) == 1 else deflections
 
 def smooth(y, window=51, poly=3):
     if len(y) < window:
         window = len(y) if len(y) % 2 == 1 else len(y) - 1
     return savgol_filter(y, window, poly) if len(y) >= 5 else y
 
-def align_and_save(res_path, video_path, output_excel, output_pdf):
+def align_and_save(res_path, video_path, output_excel, output_pdf, output_full_pdf=None):
     # Load resistance data
     df = pd.read_excel(res_path)
     df["Time (s)"] = np.arange(0, len(df) * (1 / 11.68), 1 / 11.68)
@@ -119,19 +68,23 @@ def align_and_save(res_path, video_path, output_excel, output_pdf):
         "Pixel Deflection (px)": pixel_values_smooth
     })
 
+    # Lock-in amplitude/phase over the whole aligned series
+    resp = response_table({os.path.basename(video_path): (aligned_conductance, pixel_values)}, VIDEO_FPS)
+    if len(resp): print(resp.to_string(index=False))
+
     zoom_df = out_df[(out_df["Time (s)"] >= 20) & (out_df["Time (s)"] <= 25)].copy()
     zoom_df.to_excel(output_excel, index=False)
     print(f"[SAVED] Zoomed 20–25s data exported to: {output_excel}")
 
     # Plot
     fig, ax1 = plt.subplots(figsize=(10, 5))
-    ax1.plot(zoom_df["Time (s)"], zoom_df["Conductance (mS)"], color='green', linewidth=2)
+    decimate.plot(ax1, zoom_df["Time (s)"], zoom_df["Conductance (mS)"], color='green', linewidth=2)
     ax1.set_xlabel("Time (s)", fontsize=12)
     ax1.set_ylabel("Conductance (mS)", color='green', fontsize=12)
     ax1.tick_params(axis='y', labelcolor='green')
 
     ax2 = ax1.twinx()
-    ax2.plot(zoom_df["Time (s)"], zoom_df["Pixel Deflection (px)"], color='blue', linewidth=2, linestyle='--')
+    decimate.plot(ax2, zoom_df["Time (s)"], zoom_df["Pixel Deflection (px)"], color='blue', linewidth=2, linestyle='--')
     ax2.set_ylabel("Pixel Deflection (px)", color='blue', fontsize=12)
     ax2.tick_params(axis='y', labelcolor='blue')
 
@@ -142,6 +95,35 @@ def align_and_save(res_path, video_path, output_excel, output_pdf):
     plt.show()
     print(f"[SAVED] Plot exported to PDF: {output_pdf}")
 
+    if output_full_pdf: full_plot(out_df, output_full_pdf)
+
+def full_plot(out_df, output_pdf):
+    # whole recording, min-max decimated so the PDF stays small
+    fig, ax = plt.subplots(figsize=(12, 4))
+    decimate.plot(ax, out_df["Time (s)"], out_df["Pixel Deflection (px)"], color='blue', linewidth=1)
+    ax.set_xlabel("Time (s)", fontsize=12)
+    ax.set_ylabel("Pixel Deflection (px)", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.5)
+    fig.tight_layout()
+    plt.savefig(output_pdf, format="pdf", bbox_inches='tight')
+    plt.close(fig)
+    print(f"[SAVED] Full plot exported to PDF: {output_pdf}")
+
+def batch_response(runs, output_path):
+    # runs: list of (resistance xlsx, video) pairs; one table for all of them
+    records = {}
+    for res_path, video_path in runs:
+        df = pd.read_excel(res_path)
+        res_time = np.arange(len(df)) / 11.68
+        video_time, pixel_values = get_deflection(video_path, VIDEO_FPS)
+        if len(video_time) == 0: continue
+        cond = interp1d(res_time, 1000 / df["Resistance (Ohm)"].values, fill_value="extrapolate")(video_time)
+        records[os.path.basename(video_path)] = (cond, pixel_values)
+    table = response_table(records, VIDEO_FPS)
+    table.to_excel(output_path, index=False)
+    print(f"[SAVED] Frequency response table exported to: {output_path}")
+    return table
+
 # === Run ===
 video_path = os.path.join(base_dir, video_filename)
-align_and_save(resistance_file, video_path, output_excel, output_pdf)
+align_and_save(resistance_file, video_path, output_excel, output_pdf, output_full_pdf)
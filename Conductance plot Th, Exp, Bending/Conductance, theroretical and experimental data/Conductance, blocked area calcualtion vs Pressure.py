@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -7,6 +8,15 @@ from matplotlib.backends.backend_pdf import PdfPages
 rho = 8.96  # Ohm·cm (1M KCl)
 l = 0.0075  # cm
 A = 75e-4 * 55e-4  # cm²
+
+# === Valve geometry from the mask (Mask Code + GDS/valves.py), if exported ===
+valves_file = "valves.xlsx"
+measured_valve = "V1"
+valves = pd.read_excel(valves_file) if os.path.exists(valves_file) else None
+if valves is not None and measured_valve in set(valves["Valve"]):
+    valve = valves.set_index("Valve").loc[measured_valve]
+    l, A = valve["l (cm)"], valve["A (cm²)"]
+
 inv_A = 1 / A
 rho_l = rho * l
 R1 = 1 / 0.0012  # Ohms (open valve)
@@ -44,6 +54,8 @@ blocked_area_exp.insert(0, 0.0)
 # === Theoretical Calculation Constants ===
 a_um = 75 / 2
 a = a_um * 1e-4  # cm
+if valves is not None and measured_valve in set(valves["Valve"]):
+    a = valve["a (cm)"]
 t_um = 1.8
 t = t_um * 1e-4  # cm
 E = 7e6  # Pa
@@ -54,7 +66,7 @@ C2f = 2.67
 pressures_pa = np.array(pressures_bar) * 1e5
 
 # === Deflection and Theoretical Blocked Area ===
-def calc_deflection(P):
+def calc_deflection(P, a=a):
     factor = (a * P * C2f) / (E_prime * t)
     return a * (factor)**(1/3) if P > 0 else 0.0, factor
 
@@ -107,6 +119,16 @@ df_combined = pd.DataFrame({
 })
 df_combined.to_excel("blocked_area_full_calculations.xlsx", index=False)
 
+# === Theoretical blocked area for every valve of the mask ===
+if valves is not None:
+    rows = []
+    for _, v in valves.iterrows():
+        for P_bar, P in zip(pressures_bar, pressures_pa):
+            w, _ = calc_deflection(P, v["a (cm)"])
+            rows.append({"Valve": v["Valve"], "Pressure (bar)": P_bar, "Deflection w0 (cm)": w,
+                         "Theoretical Blocked Area (%)": calc_blocked_area_percent(w, v["a (cm)"], v["A (cm²)"])[0]})
+    pd.DataFrame(rows).to_excel("blocked_area_per_valve.xlsx", index=False)
+
 # === Plot to PDF with Clear Labels ===
 with PdfPages("blocked_area_labeled_plot.pdf") as pdf:
     fig, ax1 = plt.subplots(figsize=(9, 5))
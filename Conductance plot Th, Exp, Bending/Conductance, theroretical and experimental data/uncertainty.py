@@ -0,0 +1,104 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# === Nominal constants (as in the blocked-area scripts) and relative spread ===
+# every parameter is drawn lognormal: nominal * exp(sd * N(0, 1))
+PARAMS = {
+    "rho": (8.96, 0.02),        # Ohm·cm, 1M KCl
+    "l": (0.0075, 0.05),        # cm, valve length
+    "w": (75e-4, 0.03),         # cm, channel width (A = w*h, a = w/2)
+    "h": (55e-4, 0.05),         # cm, channel height
+    "t": (1.8e-4, 0.20),        # cm, OSTEmer membrane thickness
+    "E": (7e6, 0.30),           # Pa, Young's modulus
+    "nu": (0.3, 0.05),
+    "C2f": (2.67, 0.05),
+    "G": (1.0, 0.02),           # multiplicative error on measured conductance
+}
+PER_PRESSURE = {"G"}            # drawn independently for every pressure
+
+pressures_bar = [0.0, 0.4, 0.6, 0.8, 1.2]
+conductance_mS = [1.2, 0.54, 0.43, 0.28, 0.16]
+
+BINS = np.linspace(-50, 150, 20001) # blocked area (%), 0.01 % resolution
+
+# === Vectorized models, parameters (S, 1), pressures (P,) -> (S, P) ===
+def blocked_experimental(G_mS, s):
+    G = np.asarray(G_mS) / 1000 * s["G"]
+    A = s["w"] * s["h"]
+    R1 = 1 / G[:, :1]
+    delta_R = 1 / G - R1
+    inv_A_prime = 1 / A + delta_R / (s["rho"] * s["l"])
+    return (1 - 1 / (inv_A_prime * A)) * 100
+
+def blocked_theoretical(P_pa, s):
+    P = np.asarray(P_pa, dtype=float)[None, :]
+    a = s["w"] / 2
+    A = s["w"] * s["h"]
+    E_prime = s["E"] / (1 - s["nu"])
+    w = a * np.cbrt(a * P * s["C2f"] / (E_prime * s["t"]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = (a**2 + w**2) / (2 * w)
+        theta = 2 * np.arcsin(np.minimum(a / r, 1))
+        arc = 0.5 * r**2 * theta - a * (r - w)
+    return np.where(P > 0, arc / A * 100, 0.0)
+
+def draw(rng, n, params=PARAMS):
+    npress = len(pressures_bar)
+    return {k: nom * np.exp(sd * rng.standard_normal((n, npress if k in PER_PRESSURE else 1)))
+            for k, (nom, sd) in params.items()}
+
+# === Chunked evaluation with bounded memory ===
+def run_chunk(job):
+    seed, n, chunk = job
+    rng = np.random.default_rng(seed)
+    npress = len(pressures_bar)
+    hist = np.zeros((2, npress, len(BINS)-1), dtype=np.int64)
+    sums = np.zeros((2, npress, 2))
+    P_pa = np.array(pressures_bar) * 1e5
+    G = np.asarray(conductance_mS)[None, :]
+    for start in range(0, n, chunk):
+        s = draw(rng, min(chunk, n-start))
+        for k, res in enumerate((blocked_experimental(G, s), blocked_theoretical(P_pa, s))):
+            for j in range(npress):
+                # out-of-range draws go to the edge bins so the quantiles
+                # count the same samples as the mean and SD
+                hist[k, j] += np.histogram(np.clip(res[:, j], BINS[0], BINS[-1]), BINS)[0]
+            sums[k, :, 0] += res.sum(axis=0)
+            sums[k, :, 1] += (res**2).sum(axis=0)
+    return hist, sums
+
+def quantiles(hist, qs):
+    cdf = np.cumsum(hist) / max(hist.sum(), 1)
+    centers = (BINS[:-1] + BINS[1:]) / 2
+    return [centers[min(np.searchsorted(cdf, q), len(centers)-1)] for q in qs]
+
+def propagate(n=1_000_000, chunk=100_000, workers=1, seed=0):
+    jobs_n = [n // max(workers, 1)] * max(workers, 1)
+    jobs_n[0] += n - sum(jobs_n)
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs_n))
+    jobs = [(sd, m, chunk) for sd, m in zip(seeds, jobs_n)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as ex: parts = list(ex.map(run_chunk, jobs))
+    else:
+        parts = [run_chunk(j) for j in jobs]
+    hist = sum(p[0] for p in parts)
+    sums = sum(p[1] for p in parts)
+    rows = []
+    for j, P in enumerate(pressures_bar):
+        row = {"Pressure (bar)": P}
+        for k, name in enumerate(("Experimental", "Theoretical")):
+            mean = sums[k, j, 0] / n
+            sd = np.sqrt(max(sums[k, j, 1] / n - mean**2, 0))
+            lo, med, hi = quantiles(hist[k, j], (0.025, 0.5, 0.975))
+            row.update({f"{name} Mean (%)": mean, f"{name} SD (%)": sd,
+                        f"{name} 2.5% (%)": lo, f"{name} Median (%)": med, f"{name} 97.5% (%)": hi})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+if __name__ == '__main__':
+    df = propagate(n=2_000_000, workers=os.cpu_count() or 1)
+    print(df.to_string(index=False))
+    df.to_excel("blocked_area_uncertainty.xlsx", index=False)
+    print("[SAVED] Confidence bands exported to: blocked_area_uncertainty.xlsx")
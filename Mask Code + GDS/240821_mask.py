@@ -1,5 +1,9 @@
 import gdspy as gd
+import hashlib
 import math
+import numpy as np
+import os
+import sys
 
 from parameters import p, m
 
@@ -7,6 +11,62 @@ gd_scratch = {'layer':0, 'datatype': 0}
 gd_fc = {'layer':1, 'datatype': 1}
 gd_cc = {'layer':2, 'datatype': 1}
 
+# cells are cached and shared between libraries (one per variant), so they
+# must not be registered in gdspy's global library.
+gd.library.use_current_library = False
+_cells = {}
+_registry, _names, _keys = {}, {}, {}
+
+def geometry_key(cell, grid=1e-3):
+    # hash of the cell contents at the GDS grid (1 um): own shapes plus the
+    # placement of every reference, referenced cells by their own key
+    parts = []
+    for kind, objs in ((b'poly', cell.polygons), (b'path', cell.paths)):
+        for obj in objs:
+            ps = obj if isinstance(obj, gd.PolygonSet) else obj.to_polygonset()
+            for pl, ly, dt in zip(ps.polygons, ps.layers, ps.datatypes):
+                parts.append(kind + bytes([ly % 256, dt % 256]) + np.round(np.asarray(pl)/grid).astype(np.int64).tobytes())
+    for ref in cell.references:
+        desc = (_keys.get(id(ref.ref_cell), ref.ref_cell.name), tuple(np.round(np.asarray(ref.origin)/grid).astype(int)),
+               ref.rotation, ref.magnification, ref.x_reflection,
+               getattr(ref, 'columns', None), getattr(ref, 'rows', None), getattr(ref, 'spacing', None))
+        parts.append(repr(desc).encode())
+    h = hashlib.sha1()
+    for x in sorted(parts): h.update(x)
+    return h.hexdigest()
+
+def unique_name(name, key):
+    # the role stays the last word ('fc1_h1a2b3c4d_chans'); drc.base_name()
+    # strips the tag again for the checkers
+    head, sep, role = name.rpartition('_')
+    return head+'_h'+key[:8]+'_'+role if sep else name+'_h'+key[:8]
+
+def register(cell):
+    # identical geometry shares one cell; a different cell reusing a name
+    # gets a key tag so names stay unique across a wafer
+    key = geometry_key(cell)
+    if key in _registry: return _registry[key]
+    if _names.get(cell.name, key) != key: cell.name = unique_name(cell.name, key)
+    _names[cell.name], _registry[key], _keys[id(cell)] = key, cell, key
+    return cell
+
+def cached(key, build):
+    # builds a sub-cell once per process for each distinct parameter key
+    if key not in _cells: _cells[key] = register(build())
+    return _cells[key]
+
+def write_cells(tops, fname, unit=1e-03, precision=1e-06):
+    # streams every cell once, dependencies first, without a GdsLibrary
+    writer = gd.GdsWriter(fname, unit=unit, precision=precision)
+    done = set()
+    def emit(c):
+        if id(c) in done: return
+        done.add(id(c))
+        for d in sorted(c.get_dependencies(False), key=lambda x: x.name): emit(d)
+        writer.write_cell(c)
+    for c in tops: emit(c)
+    writer.close()
+
 
 cdia, tubedia = 0.03*25.5, 0.03*25.5 #tube dia is 0.01", but made it 0.012", (reverted back for making good mold)
 p.conedia = cdia*1.6
@@ -20,30 +80,37 @@ p.io_cols = 3
 m.ch_xgap = p.io_xgap
 m.ch_ygap = p.io_ygap
 m.ch_w = 0.075 # 75 micro wide channels
+m.ch_n = 3
+m.chamber = 0.100 # half size of the square chambers
+p.nutgap = 11
 
 def get_ioport_locs(p, xdir):
     # every odd numbered columns is half-y-shifted and has one extra element.
-    locs = []
-    ncols, nrows = 3, 10
+    ncols, nrows = p.io_cols, p.io_rows
     x0, y0 = 0, 0 #xdir*(-p.L/2+p.bdrypad+p.xgap+p.rad*(ncols/2+2)), 0
     if xdir==0: xdir = 1
-    cols = [xdir*x for x in range(-ncols//2+1, ncols//2+1)]
-    rows = [y for y in range(-nrows//2+1, nrows//2+1)]
-    for i in cols:
-        yoffset = 0
-        if abs(i%2)!=1: yoffset = p.io_ygap/2
-        for j in rows:
-            locs.append([x0+i*p.io_xgap, y0+j*p.io_ygap-yoffset])
-        if i%2!=1: locs.append([x0+i*p.io_xgap, y0+j*p.io_ygap+yoffset])
-    return locs
+    cols = xdir*np.arange(-ncols//2+1, ncols//2+1)
+    rows = np.arange(-nrows//2+1, nrows//2+1)
+    yoffset = np.where(cols%2!=1, p.io_ygap/2, 0)
+    # (ncols, nrows+1) grid, the last slot is the extra element
+    ys = np.concatenate([y0+rows[None, :]*p.io_ygap-yoffset[:, None], y0+rows[-1]*p.io_ygap+yoffset[:, None]], axis=1)
+    xs = np.broadcast_to((x0+cols*p.io_xgap)[:, None], ys.shape)
+    keep = np.ones(ys.shape, dtype=bool)
+    keep[:, -1] = cols%2!=1
+    return np.stack([xs[keep], ys[keep]], axis=1).tolist()
 
 def get_port(name='port', lname=gd_scratch['layer'], dname=gd_scratch['datatype']):
     global p
-    c = gd.Cell(name)
-    rad = p.io_dia/2
-    port = gd.Round((0, 0), rad, tolerance=0.01)
-    return c.add(port)
+    def build():
+        c = gd.Cell(name)
+        rad = p.io_dia/2
+        port = gd.Round((0, 0), rad, tolerance=0.01)
+        return c.add(port)
+    return cached(('port', name, p.io_dia), build)
 def ports_arrange(pat, name):
+    key = ('ports', name, pat.name, p.io_dia, p.io_rows, p.io_cols, p.io_xgap, p.io_ygap)
+    return cached(key, lambda: _ports_arrange(pat, name))
+def _ports_arrange(pat, name):
     c = gd.Cell(name)
     _col1 = gd.CellArray(pat, 1, p.io_rows, (0, p.io_ygap), origin=(0, -(int(p.io_rows/2)-0.5)*p.io_ygap))
     _col2 = gd.CellArray(pat, 1, p.io_rows-1, (0, p.io_ygap), origin=(p.io_xgap, -(int(p.io_rows/2)-1)*p.io_ygap))
@@ -53,6 +120,8 @@ def ports_arrange(pat, name):
     return c.add([_col1, _col2])
 
 def cross(l, w, name):
+    return cached(('cross', name, l, w), lambda: _cross(l, w, name))
+def _cross(l, w, name):
     r1 = gd.Rectangle((-l, -w), (l, w))
     r2 = gd.Rectangle((-w, -l), (w, l))
     cross = gd.boolean(r1, r2, 'or')
@@ -64,7 +133,7 @@ def background(name='bg', lname=gd_scratch['layer'], dname=gd_scratch['datatype'
     pad, wid = 0.5, 0.4
     l, w = p.chip_l/2, p.chip_w/2
     bdry = gd.FlexPath([(-l, -w), (-l, w), (l, w), (l, -w), (-l, -w)], wid/2, gdsii_path=True, layer=lname, datatype=dname)
-    cross1, cross2 = cross(pad, wid/4, name+'_amarks'), cross(pad, wid/8, name+'_amarks_close')
+    cross1, cross2 = cross(pad, wid/4, 'bg_amarks'), cross(pad, wid/8, 'bg_amarks_close')
     xgap, ygap = 2*l-4*pad, 2*w-4*pad
     amarks = gd.CellArray(cross1, 2, 2, (xgap, ygap), origin=(-xgap/2, -ygap/2))
     xgap, ygap = 1.5*l-2*pad, 1.5*w-2*pad
@@ -74,56 +143,79 @@ def background(name='bg', lname=gd_scratch['layer'], dname=gd_scratch['datatype'
     return c.add([amarks, amarks1, bdry]) #, bdry1])
 
 
+def manhattan_rects(paths, w):
+    # Manhattan polylines as one (n, 4, 2) array of segment rectangles. Inner
+    # vertices extend both segments by w/2, which is FlexPath's natural join
+    # at right angles; the ends are flush.
+    pts = [np.asarray(pl, dtype=float) for pl in paths]
+    a = np.concatenate([pl[:-1] for pl in pts])
+    b = np.concatenate([pl[1:] for pl in pts])
+    first = np.concatenate([np.arange(len(pl)-1) == 0 for pl in pts])
+    last = np.concatenate([np.arange(len(pl)-1) == len(pl)-2 for pl in pts])
+    d = (b - a) / np.linalg.norm(b - a, axis=1, keepdims=True)
+    n = np.stack([-d[:, 1], d[:, 0]], axis=1) * w/2
+    a = a - d * np.where(first, 0, w/2)[:, None]
+    b = b + d * np.where(last, 0, w/2)[:, None]
+    return np.stack([a-n, b-n, b+n, a+n], axis=1)
+
+def merge_rects(rects, **kwargs):
+    # one boolean pass over all rectangles of a layer
+    return gd.boolean(list(rects), None, 'or', **kwargs)
+
 def extend_ports(to, ys, w, sign, xshift=0, yshift=0):
     # sign=-1 means that we are using right side ports and have
     # to extend to the left side, and also start from the bottom
     # port. that is sign=-1 mirrors sign=1 both in H and V directions
-    ex = []
     ex_start, ex_xgap = 1, 0.4
-    i = sign*(p.io_rows-1)
-    for y in ys:
-        plist = []
-        if y==0: i-=sign*1; continue
-        p0 = sign*(i%2)*p.io_xgap, i*p.io_ygap/2
-        p1 = sign*(p.io_xgap+ex_start+abs(i)*ex_xgap), p0[1]
-        p2 = p1[0], y
-        p3 = sign*to, y
-        plist += p0, p1
-        if p1!=p2: plist += p2, p3
-        else: plist += p3
-        plist = [(x[0]+xshift, x[1]+yshift) for x in plist]
-        ex.append(gd.FlexPath(plist, w, gdsii_path=True))
-        i-=sign*1
-    return ex
+    ys = np.asarray(ys, dtype=float)
+    i = sign*(p.io_rows-1) - sign*np.arange(len(ys))
+    i, ys = i[ys!=0], ys[ys!=0]
+    p0 = np.stack([sign*(i%2)*p.io_xgap, i*p.io_ygap/2], axis=1)
+    p1 = np.stack([sign*(p.io_xgap+ex_start+abs(i)*ex_xgap), p0[:, 1]], axis=1)
+    p2 = np.stack([p1[:, 0], ys], axis=1)
+    p3 = np.stack([np.full(len(ys), sign*to), ys], axis=1)
+    routes = np.stack([p0, p1, p2, p3], axis=1) + (xshift, yshift)
+    # a port already level with its target needs no vertical leg
+    return [gd.FlexPath((r if y!=q[1] else r[[0, 1, 3]]).tolist(), w, gdsii_path=True)
+            for r, y, q in zip(routes, ys, p0)]
 
 def makech(l, w, which='fc', xdir=1, suff='1'):
+    key = ('chans', which, l, w, xdir, suff, m.ch_xgap, m.ch_ygap)
+    return cached(key, lambda: _makech(l, w, which, xdir, suff))
+def _makech(l, w, which='fc', xdir=1, suff='1'):
     #c = gd.Cell('channels')
     y1, y2 = m.ch_ygap, -m.ch_ygap
     if which=='fc':
-        ch1 = gd.FlexPath([(0, 0), (xdir*l, 0)], w, gdsii_path=True)
-        ch2 = gd.FlexPath([(0, -y1), (xdir*l, -y1), (xdir*l, 0)], w, gdsii_path=True)
-        ch3 = gd.FlexPath([(0, y1), (xdir*l, y1), (xdir*l, 0)], w, gdsii_path=True)
-        ch = gd.boolean(ch1, ch2, 'or')
-        ch = gd.boolean(ch, ch3, 'or')
-        ctmp = gd.Cell(which+suff+'_chans')
-        return ctmp.add(ch)
+        paths = [[(0, 0), (xdir*l, 0)],
+                 [(0, -y1), (xdir*l, -y1), (xdir*l, 0)],
+                 [(0, y1), (xdir*l, y1), (xdir*l, 0)]]
     if which=='cc':
         extra_factor = 10 # determines how much CC extends over the valve crossing.
-        ch1 = gd.FlexPath([(xdir*(-m.ch_xgap-m.ch_w), -m.ch_ygap/2), (xdir*(l+extra_factor*w), -m.ch_ygap/2)], w, gdsii_path=True)
-        ch2 = gd.FlexPath([(xdir*(-m.ch_xgap-m.ch_w), +m.ch_ygap/2), (xdir*(l+extra_factor*w), +m.ch_ygap/2)], w, gdsii_path=True)
-        ch = gd.boolean(ch1, ch2, 'or')
-        ctmp = gd.Cell(which+suff+'_chans')
-        return ctmp.add(ch)
+        x0, x1 = xdir*(-m.ch_xgap-m.ch_w), xdir*(l+extra_factor*w)
+        paths = [[(x0, -m.ch_ygap/2), (x1, -m.ch_ygap/2)],
+                 [(x0, +m.ch_ygap/2), (x1, +m.ch_ygap/2)]]
+    ch = merge_rects(manhattan_rects(paths, w))
+    ctmp = gd.Cell(which+suff+'_chans')
+    return ctmp.add(ch)
 
 def makesupport():
     pass    
 
-def flowcyto(layer='fc'):
+def get_chamber(name='chambers'):
+    def build():
+        s = m.chamber
+        return gd.Cell(name).add(gd.Rectangle((-s, -s), (s, s)))
+    return cached(('chamber', name, m.chamber), build)
+
+def flowcyto(layer='fc', tag='', outdir='.'):
+    ident, top = build_flowcyto(layer, tag)
+    write_cells([top], os.path.join(outdir, ident+'.gds'))
+    return ident+'.gds'
+
+def build_flowcyto(layer='fc', tag=''):
     global p
     global m
-    lib = gd.GdsLibrary(unit=1e-03, precision=1e-06)
 
-    p.nutgap = 11
     m.ch_l = p.nutgap
     #ch_l, ch_w, ch_ygap, ch_n = p.nutgap, m.ch_l, m.ch_ygap, m.ch_n
     #print(get_ioport_locs(p, 0))
@@ -139,13 +231,10 @@ def flowcyto(layer='fc'):
         chcc1 = makech(m.ch_l, m.ch_w, which='cc', xdir=-1, suff='2')
 
     y = m.ch_ygap
-    m.ch_n = 3
     if layer=='fc':
         chfc_ary = gd.CellArray(chfc, 1, m.ch_n, (0, 3*y), origin=(-p.nutgap*1.5+p.io_xgap, -(m.ch_n-1)*3*y/2))
         chfc1_ary = gd.CellArray(chfc1, 1, m.ch_n, (0, 3*y), origin=(+p.nutgap*1.5-p.io_xgap, -(m.ch_n-1)*3*y/2))
-        chamber = gd.Rectangle((-0.100, -0.100), (0.100, 0.100))
-        ctmp = gd.Cell('chambers')
-        ctmp.add(chamber)
+        ctmp = get_chamber()
         chambers = gd.CellArray(ctmp, 2, m.ch_n, (3.5*2, 2*p.io_xgap), origin=(-3.5, -2*p.io_xgap))
     else:
         chcc_ary = gd.CellArray(chcc, 1, m.ch_n, (0, 3*y), origin=(-p.nutgap*1.5+p.io_xgap, -(m.ch_n-1)*3*y/2))
@@ -164,16 +253,16 @@ def flowcyto(layer='fc'):
     #    port_ext += extend_ports(p.nutgap/2, ys, m.ch_w, s, xshift=-s*p.nutgap*1.5)
 
     l, w = p.chip_l/2 - 5*0.5, p.chip_w/2 - 2*0.5 
-    ident ='240821-flowcyto-'+layer
+    ident ='240821-flowcyto-'+layer+tag
     text = gd.Text(ident, 0.4, (-l, -w))
-    bg = background()
+    bg = background('bg'+tag)
     #bg.add([ioports, chary, chary2, text]+port_ext)
     if layer=='fc':
         bg.add([ioports, chfc_ary, chfc1_ary, chambers, text]) #+port_ext)
     else:
         bg.add([ioports, chcc_ary, chcc1_ary, text]) #+port_ext)
-    lib.add(bg)
-    lib.write_gds(ident+'.gds')
+    return ident, bg
 
-#flowcyto(layer='fc')
-flowcyto(layer='cc')
\ No newline at end of file
+if __name__ == '__main__':
+    for layer in sys.argv[1:] or ['fc', 'cc']:
+        flowcyto(layer=layer)
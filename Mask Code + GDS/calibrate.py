@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import hashlib
+import cv2
+import numpy as np
+
+from drc import load_shapes
+from valves import extract_valves
+from calibration import calibration_path, load_calibration
+
+# ========== Layout Rasterization ==========
+# A region of the chip GDS is drawn once at RASTER_UM um/px and cached as
+# .npy next to the GDS. Layout coordinates are mm with y up, image rows go
+# down, so row 0 is the top edge (ymax) of the region.
+
+RASTER_UM = 0.5
+PIXEL_TO_UM = 0.174 # nominal 4.5X value, centre of the scale search
+
+def drawable(label): return not label.endswith('/poly')
+
+def rasterize(srcs, bbox, um_per_px=RASTER_UM, select=drawable, cache=True):
+    # srcs: one GDS file or a list of them (fc and cc overlap in the video)
+    if isinstance(srcs, str): srcs = [srcs]
+    sig = [(os.path.abspath(s), os.path.getmtime(s)) for s in srcs]
+    key = hashlib.sha1(repr((sig, tuple(bbox), um_per_px)).encode()).hexdigest()[:12]
+    path = srcs[0] + '.raster-' + key + '.npy'
+    if cache and os.path.exists(path): return np.load(path)
+    scale = 1000 / um_per_px # px per mm
+    w, h = int(round((bbox[2]-bbox[0])*scale)), int(round((bbox[3]-bbox[1])*scale))
+    img = np.zeros((h, w), np.uint8)
+    for k, src in enumerate(srcs):
+        shade = 255 - 100*k
+        for lb, pl in zip(*load_shapes(src)):
+            if not select(lb): continue
+            if pl[:, 0].max() < bbox[0] or pl[:, 0].min() > bbox[2] or pl[:, 1].max() < bbox[1] or pl[:, 1].min() > bbox[3]: continue
+            px = np.column_stack([(pl[:, 0]-bbox[0])*scale, (bbox[3]-pl[:, 1])*scale])
+            cv2.fillPoly(img, [np.round(px*16).astype(np.int32)], shade, lineType=cv2.LINE_AA, shift=4)
+    if cache: np.save(path, img)
+    return img
+
+# ========== Registration ==========
+def edges(img, blur=3):
+    g = cv2.GaussianBlur(img.astype(np.float32), (0, 0), blur)
+    gx, gy = cv2.Sobel(g, cv2.CV_32F, 1, 0), cv2.Sobel(g, cv2.CV_32F, 0, 1)
+    return cv2.magnitude(gx, gy)
+
+def match_scales(gray, ref, scales, raster_um):
+    best = (-1.0, None, None)
+    for s in scales:
+        f = s / raster_um
+        small = cv2.resize(gray, None, fx=f, fy=f, interpolation=cv2.INTER_AREA)
+        if small.shape[0] >= ref.shape[0] or small.shape[1] >= ref.shape[1] or min(small.shape) < 16: continue
+        tpl = edges(small)
+        res = cv2.matchTemplate(ref, tpl, cv2.TM_CCOEFF_NORMED)
+        # windows of the layout with far less edge energy than the frame
+        # (empty field) give meaningless correlations
+        th, tw = tpl.shape
+        m1 = cv2.boxFilter(ref, -1, (tw, th), anchor=(0, 0), borderType=cv2.BORDER_CONSTANT)
+        m2 = cv2.boxFilter(ref*ref, -1, (tw, th), anchor=(0, 0), borderType=cv2.BORDER_CONSTANT)
+        var = (m2 - m1*m1)[:res.shape[0], :res.shape[1]]
+        res[~np.isfinite(res) | (var < 0.25*tpl.var())] = -1
+        _, score, _, loc = cv2.minMaxLoc(res)
+        if score > best[0]: best = (score, s, loc)
+    return best
+
+def register(frame, raster, bbox, raster_um=RASTER_UM, scales=None):
+    # scale and offset of the video frame inside the rasterized layout by
+    # edge correlation; rotation is assumed to be aligned to the stage
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    ref = edges(raster)
+    if scales is None: scales = PIXEL_TO_UM * np.geomspace(0.5, 2, 25)
+    score, s, loc = match_scales(gray, ref, scales, raster_um)
+    if s is None: raise ValueError("frame does not fit inside the rasterized region at any scale")
+    score, s, loc = match_scales(gray, ref, s * np.geomspace(0.97, 1.03, 13), raster_um)
+    origin = (bbox[0] + loc[0]*raster_um/1000, bbox[3] - loc[1]*raster_um/1000)
+    return {'um_per_px': float(s), 'origin_mm': [float(origin[0]), float(origin[1])], 'score': float(score)}
+
+def to_mm(cal, px):
+    px = np.asarray(px, dtype=float)
+    s, (x0, y0) = cal['um_per_px']/1000, cal['origin_mm']
+    return np.column_stack([x0 + px[..., 0]*s, y0 - px[..., 1]*s])
+
+def to_px(cal, mm):
+    mm = np.asarray(mm, dtype=float)
+    s, (x0, y0) = cal['um_per_px']/1000, cal['origin_mm']
+    return np.column_stack([(mm[..., 0]-x0)/s, (y0-mm[..., 1])/s])
+
+def valve_rois(cal, valves, shape, pad=2.0):
+    # (p1, p2, p3, p4) per valve in the convention of deflectionpixels():
+    # p1 bottom-left, p2 top-right, p3-p4 the horizontal centre scan line
+    rois = {}
+    h, w = shape[:2]
+    for _, v in valves.iterrows():
+        half = pad * max(v["Flow Width (mm)"], v["Control Width (mm)"]) / 2
+        (xa, ya), (xb, yb) = to_px(cal, [[v["X (mm)"]-half, v["Y (mm)"]-half], [v["X (mm)"]+half, v["Y (mm)"]+half]])
+        x1, x2 = int(max(xa, 0)), int(min(xb, w-1))
+        y1, y2 = int(max(yb, 0)), int(min(ya, h-1))
+        if x2 <= x1 or y2 <= y1: continue
+        yc = (y1 + y2) // 2
+        rois[v["Valve"]] = ((x1, y2), (x2, y1), (x1, yc), (x2, yc))
+    return rois
+
+def calibrate(video, gds, bbox, frameno=100, valves=None):
+    cap = cv2.VideoCapture(video)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frameno)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret: raise ValueError(f"cannot read frame {frameno} of {video}")
+    cal = register(frame, rasterize(gds, bbox), bbox)
+    if valves is not None:
+        cal['rois'] = {k: [list(p) for p in r] for k, r in valve_rois(cal, valves, frame.shape).items()}
+    with open(calibration_path(video), 'w') as f: json.dump(cal, f, indent=1)
+    print(f"[SAVED] {cal['um_per_px']:.4f} um/px (score {cal['score']:.2f}) to: {calibration_path(video)}")
+    return cal
+
+if __name__ == '__main__':
+    # calibrate.py video fc.gds [cc.gds] xmin ymin xmax ymax
+    # with both layers the valve crossings give the suggested ROIs
+    video, gds, bbox = sys.argv[1], sys.argv[2:-4], [float(x) for x in sys.argv[-4:]]
+    valves = extract_valves(*gds) if len(gds) == 2 else None
+    calibrate(video, gds, bbox, valves=valves)
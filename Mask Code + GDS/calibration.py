@@ -0,0 +1,15 @@
+import os
+import json
+
+# ========== Calibration File ==========
+# <video>.calib.json as written by calibrate.py: um/px, layout origin and
+# suggested valve ROIs. Kept apart from calibrate.py so the video scripts
+# can read it without the GDS stack (drc, gdspy).
+
+def calibration_path(video):
+    return video + '.calib.json'
+
+def load_calibration(video):
+    path = calibration_path(video)
+    if not os.path.exists(path): return None
+    with open(path) as f: return json.load(f)
@@ -0,0 +1,183 @@
+import re
+import sys
+import json
+import numpy as np
+import gdspy as gd
+
+# ========== Design-Rule / Layer-Overlap Checks ==========
+# Shapes are flattened with a label naming the top-level cell they come
+# from ('fc1_chans', 'inlet_array', 'bg_amarks', ...), or 'bg/path' and
+# 'bg/poly' for the boundary path and the text drawn directly in 'bg'.
+# Pairs are found through a uniform grid index over edge bounding boxes, so
+# only nearby edges are ever compared.
+
+def load_shapes(src):
+    # src: GDS file name, GdsLibrary or Cell
+    if isinstance(src, str): src = gd.GdsLibrary(infile=src)
+    top = src.top_level()[0] if isinstance(src, gd.GdsLibrary) else src
+    labels, polys = [], []
+    for kind, objs in (('path', top.paths), ('poly', top.polygons)):
+        for obj in objs:
+            for pl in (obj.polygons if hasattr(obj, 'polygons') else obj.get_polygons()):
+                labels.append(top.name+'/'+kind)
+                polys.append(np.asarray(pl, dtype=float))
+    for ref in top.references:
+        for pl in ref.get_polygons():
+            labels.append(ref.ref_cell.name)
+            polys.append(np.asarray(pl, dtype=float))
+    return labels, polys
+
+def base_name(label):
+    # cell name without the '_h<key>' tag register() adds on a name clash
+    return re.sub(r'_h[0-9a-f]{8}(?=_|$)', '', label)
+
+def is_channel(label): return base_name(label).endswith('_chans')
+def is_chamber(label): return base_name(label) == 'chambers'
+def is_port(label): return base_name(label) == 'inlet_array'
+
+# ========== Spatial Index ==========
+def candidate_pairs(bboxes, pad=0.0, cell=None):
+    # bboxes: (n, 4) xmin, ymin, xmax, ymax. Returns (k, 2) index pairs whose
+    # boxes come within pad of each other.
+    b = np.asarray(bboxes, dtype=float)
+    n = len(b)
+    if n < 2: return np.zeros((0, 2), dtype=int)
+    b = b + np.array([-pad/2, -pad/2, pad/2, pad/2])
+    if cell is None:
+        cell = max(np.median(np.maximum(b[:, 2]-b[:, 0], b[:, 3]-b[:, 1])), pad, 1e-9)
+    ix0, iy0 = np.floor(b[:, 0]/cell).astype(np.int64), np.floor(b[:, 1]/cell).astype(np.int64)
+    ix1, iy1 = np.floor(b[:, 2]/cell).astype(np.int64), np.floor(b[:, 3]/cell).astype(np.int64)
+    nx, ny = ix1-ix0+1, iy1-iy0+1
+    cnt = nx*ny
+    item = np.repeat(np.arange(n), cnt)
+    local = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt)-cnt, cnt)
+    cx = ix0[item] + local % nx[item]
+    cy = iy0[item] + local // nx[item]
+    order = np.lexsort((item, cy, cx))
+    cx, cy, item = cx[order], cy[order], item[order]
+    starts = np.flatnonzero(np.r_[True, (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1]), True])
+    pairs = []
+    for s, e in zip(starts[:-1], starts[1:]):
+        if e - s < 2: continue
+        ids = item[s:e]
+        i, j = np.triu_indices(len(ids), 1)
+        pairs.append(np.stack([ids[i], ids[j]], axis=1))
+    if not pairs: return np.zeros((0, 2), dtype=int)
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    a, c = b[pairs[:, 0]], b[pairs[:, 1]]
+    keep = (a[:, 0] <= c[:, 2]) & (c[:, 0] <= a[:, 2]) & (a[:, 1] <= c[:, 3]) & (c[:, 1] <= a[:, 3])
+    return pairs[keep]
+
+# ========== Geometry Helpers ==========
+def polygon_edges(polys):
+    a = np.concatenate(polys)
+    b = np.concatenate([np.roll(pl, -1, axis=0) for pl in polys])
+    owner = np.repeat(np.arange(len(polys)), [len(pl) for pl in polys])
+    return a, b, owner
+
+def point_seg_dist(p, a, b):
+    ab = b - a
+    den = np.maximum((ab*ab).sum(-1), 1e-30)
+    t = np.clip(((p-a)*ab).sum(-1) / den, 0, 1)
+    return np.linalg.norm(p - (a + t[:, None]*ab), axis=-1)
+
+def seg_seg_dist(p1, p2, q1, q2):
+    def cross(u, v): return u[:, 0]*v[:, 1] - u[:, 1]*v[:, 0]
+    d1, d2 = cross(q2-q1, p1-q1), cross(q2-q1, p2-q1)
+    d3, d4 = cross(p2-p1, q1-p1), cross(p2-p1, q2-p1)
+    hit = (d1*d2 <= 0) & (d3*d4 <= 0) & ~((d1 == 0) & (d2 == 0))
+    d = np.minimum.reduce([point_seg_dist(p1, q1, q2), point_seg_dist(p2, q1, q2),
+                           point_seg_dist(q1, p1, p2), point_seg_dist(q2, p1, p2)])
+    return np.where(hit, 0.0, d)
+
+def polygon_area(pl):
+    x, y = pl[:, 0], pl[:, 1]
+    return 0.5*abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+# ========== Rules ==========
+def check_width(labels, polys, min_width, select=is_channel, precision=1e-4):
+    # morphological opening: anything narrower than min_width disappears.
+    # The offset stops one precision step short so width == min_width passes
+    out, r = [], min_width/2 - precision
+    for i, (lb, pl) in enumerate(zip(labels, polys)):
+        if not select(lb): continue
+        area = polygon_area(pl)
+        shrunk = gd.offset([pl], -r, precision=precision)
+        opened = gd.offset(shrunk, r, precision=precision) if shrunk is not None else None
+        kept = sum(polygon_area(np.asarray(q)) for q in opened.polygons) if opened is not None else 0.0
+        if kept < 0.999*area:
+            c = pl.mean(axis=0)
+            out.append({'rule': 'min_width', 'a': i, 'label_a': lb, 'limit': min_width,
+                        'lost_area': area-kept, 'x': c[0], 'y': c[1]})
+    return out
+
+def check_spacing(labels, polys, min_spacing, pair_ok=None):
+    # only near misses are reported: shapes that touch or overlap are
+    # connected on purpose (channels running into ports)
+    if pair_ok is None:
+        pair_ok = lambda a, b: (is_channel(a) or is_channel(b)) and not (a.endswith('/poly') or b.endswith('/poly'))
+    a, b, owner = polygon_edges(polys)
+    bb = np.column_stack([np.minimum(a, b), np.maximum(a, b)])
+    pairs = candidate_pairs(bb, pad=min_spacing)
+    pairs = pairs[owner[pairs[:, 0]] != owner[pairs[:, 1]]]
+    if len(pairs) == 0: return []
+    d = seg_seg_dist(a[pairs[:, 0]], b[pairs[:, 0]], a[pairs[:, 1]], b[pairs[:, 1]])
+    pp = np.sort(owner[pairs], axis=1)
+    keys, inv = np.unique(pp, axis=0, return_inverse=True)
+    dmin = np.full(len(keys), np.inf)
+    np.minimum.at(dmin, inv.ravel(), d)
+    out = []
+    for (i, j), dist in zip(keys, dmin):
+        if dist == 0 or dist >= min_spacing or not pair_ok(labels[i], labels[j]): continue
+        if gd.inside([polys[i][0]], [polys[j]])[0] or gd.inside([polys[j][0]], [polys[i]])[0]: continue
+        c = (polys[i].mean(axis=0) + polys[j].mean(axis=0)) / 2
+        out.append({'rule': 'min_spacing', 'a': int(i), 'b': int(j), 'label_a': labels[i], 'label_b': labels[j],
+                    'limit': min_spacing, 'distance': float(dist), 'x': c[0], 'y': c[1]})
+    return out
+
+def crossings(fc_polys, cc_polys, precision=1e-4):
+    # (fc index, cc index, intersection polygons) for every overlap
+    bb = [np.r_[pl.min(0), pl.max(0)] for pl in list(fc_polys) + list(cc_polys)]
+    n = len(fc_polys)
+    pairs = candidate_pairs(bb)
+    pairs = pairs[(pairs[:, 0] < n) & (pairs[:, 1] >= n)]
+    out = []
+    for i, j in pairs:
+        res = gd.boolean([fc_polys[i]], [cc_polys[j-n]], 'and', precision=precision)
+        if res is not None: out.append((int(i), int(j-n), [np.asarray(q) for q in res.polygons]))
+    return out
+
+def check_crossings(fc, cc):
+    # every control channel has to cross a flow channel (the valve) and
+    # must not run over the fc chambers
+    fl, fp = fc
+    cl, cp = cc
+    out = []
+    hits = crossings(fp, cp)
+    crossed = {j for i, j, _ in hits if is_channel(fl[i])}
+    for j, lb in enumerate(cl):
+        if is_channel(lb) and j not in crossed:
+            c = cp[j].mean(axis=0)
+            out.append({'rule': 'cc_no_crossing', 'b': j, 'label_b': lb, 'x': c[0], 'y': c[1]})
+    for i, j, inter in hits:
+        if is_chamber(fl[i]) and is_channel(cl[j]):
+            c = np.concatenate(inter).mean(axis=0)
+            out.append({'rule': 'cc_over_chamber', 'a': i, 'b': j, 'label_a': fl[i], 'label_b': cl[j],
+                        'area': float(sum(polygon_area(q) for q in inter)), 'x': c[0], 'y': c[1]})
+    return out
+
+def run_drc(fc, cc=None, min_width=0.05, min_spacing=0.1, report=None):
+    fc = load_shapes(fc)
+    res = {'fc': check_width(*fc, min_width) + check_spacing(*fc, min_spacing)}
+    if cc is not None:
+        cc = load_shapes(cc)
+        res['cc'] = check_width(*cc, min_width) + check_spacing(*cc, min_spacing)
+        res['fc/cc'] = check_crossings(fc, cc)
+    if report is not None:
+        with open(report, 'w') as f: json.dump(res, f, indent=1, default=float)
+        print(f"[SAVED] DRC report: {report} ({sum(map(len, res.values()))} violations)")
+    return res
+
+if __name__ == '__main__':
+    fc, cc = sys.argv[1:3] if len(sys.argv) > 2 else ('240821-fc.gds', '240821-cc.gds')
+    run_drc(fc, cc, report='drc_report.json')
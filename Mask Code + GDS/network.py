@@ -0,0 +1,238 @@
+import sys
+import numpy as np
+import pandas as pd
+import gdspy as gd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from scipy.sparse.csgraph import connected_components
+
+from drc import load_shapes, is_channel, is_chamber, is_port
+from valves import extract_valves, CH_HEIGHT
+
+# ========== Channel Network Extraction ==========
+# The flow layer (channels and chambers) is merged and cut into rectangles by
+# horizontal slabs; the channels are Manhattan, so every rectangle is a
+# straight piece of channel. Nodes are the contacts between rectangles, the
+# ports and chambers (terminals) and the two ends of every valve; inside a
+# rectangle the nodes are chained along its long axis. Layout units are mm.
+
+RHO = 8.96      # Ohm·cm, 1M KCl
+MU = 1e-3       # Pa·s, water
+GRID = 1e-6     # mm, snapping of the merged outline
+
+def slab_rectangles(pl):
+    # rectilinear polygon -> (k, 4) xmin, ymin, xmax, ymax
+    a, b = pl, np.roll(pl, -1, axis=0)
+    vert = a[:, 0] == b[:, 0]
+    ex, ey0, ey1 = a[vert, 0], np.minimum(a[vert, 1], b[vert, 1]), np.maximum(a[vert, 1], b[vert, 1])
+    ys = np.unique(pl[:, 1])
+    mid = (ys[:-1] + ys[1:]) / 2
+    span = (ey0[None, :] < mid[:, None]) & (mid[:, None] < ey1[None, :])
+    rects = []
+    for s in range(len(mid)):
+        xs = np.sort(ex[span[s]])
+        for x0, x1 in zip(xs[0::2], xs[1::2]):
+            rects.append((x0, ys[s], x1, ys[s+1]))
+    return merge_runs(np.array(rects).reshape(-1, 4))
+
+def merge_runs(r):
+    # stack slabs with the same x-interval that touch in y (cuts made by
+    # vertices elsewhere in the polygon)
+    r = r[np.lexsort((r[:, 1], r[:, 2], r[:, 0]))]
+    out = []
+    for q in r:
+        if out and out[-1][0] == q[0] and out[-1][2] == q[2] and out[-1][3] == q[1]: out[-1][3] = q[3]
+        else: out.append(list(q))
+    return np.array(out)
+
+def contacts(rects):
+    # shared edges between rectangles: (i, j, x, y) at the middle of the edge
+    x0, y0, x1, y1 = rects.T
+    ox = np.minimum(x1[:, None], x1[None, :]) - np.maximum(x0[:, None], x0[None, :])
+    oy = np.minimum(y1[:, None], y1[None, :]) - np.maximum(y0[:, None], y0[None, :])
+    above = (y1[:, None] == y0[None, :]) & (ox > 0)
+    beside = (x1[:, None] == x0[None, :]) & (oy > 0)
+    out = []
+    for i, j in zip(*np.nonzero(above)):
+        out.append((i, j, (max(x0[i], x0[j]) + min(x1[i], x1[j])) / 2, y1[i]))
+    for i, j in zip(*np.nonzero(beside)):
+        out.append((i, j, x1[i], (max(y0[i], y0[j]) + min(y1[i], y1[j])) / 2))
+    return out
+
+def locate(rects, pt):
+    x0, y0, x1, y1 = rects.T
+    hit = np.flatnonzero((x0 <= pt[0]) & (pt[0] <= x1) & (y0 <= pt[1]) & (pt[1] <= y1))
+    return int(hit[0]) if len(hit) else None
+
+class Network:
+    def __init__(self, fc, cc=None, height=CH_HEIGHT, valves=None):
+        labels, polys = load_shapes(fc)
+        flow = [pl for lb, pl in zip(labels, polys) if is_channel(lb) or is_chamber(lb)]
+        merged = gd.boolean(flow, None, 'or', precision=GRID)
+        self.rects = np.concatenate([slab_rectangles(np.round(np.asarray(q) / GRID) * GRID) for q in merged.polygons])
+        self.height = height
+        if valves is None: valves = extract_valves(fc, cc, height) if cc is not None else pd.DataFrame()
+        self.valves = valves
+        self._build(labels, polys)
+        self._reduced = {}
+
+    def _node(self, name=None):
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def _build(self, labels, polys):
+        self.names = []
+        pts = [[] for _ in self.rects]           # per rectangle: (coordinate, node)
+        for i, j, x, y in contacts(self.rects):
+            k = self._node()
+            pts[i].append((x, y, k))
+            pts[j].append((x, y, k))
+        # terminals: chamber centres and ports touching a channel end
+        terms = []
+        for lb, pl in zip(labels, polys):
+            if is_chamber(lb): terms.append(('C', pl.mean(axis=0)))
+            if is_port(lb):
+                c, r = pl.mean(axis=0), np.linalg.norm(pl - pl.mean(axis=0), axis=1).max()
+                x0, y0, x1, y1 = self.rects.T
+                near = (np.maximum(np.maximum(x0-c[0], c[0]-x1), 0)**2 + np.maximum(np.maximum(y0-c[1], c[1]-y1), 0)**2) <= r**2
+                if near.any():
+                    q = self.rects[np.flatnonzero(near)[0]]
+                    terms.append(('P', np.clip(c, q[:2], q[2:])))
+        terms.sort(key=lambda t: (t[0], -round(t[1][1], 6), round(t[1][0], 6)))
+        count = {'C': 0, 'P': 0}
+        self.terminals = {}
+        for kind, c in terms:
+            r = locate(self.rects, c)
+            if r is None: continue
+            count[kind] += 1
+            name = f"{kind}{count[kind]}"
+            k = self._node(name)
+            self.terminals[name] = k
+            pts[r].append((c[0], c[1], k))
+        # valves: both ends of the blocked length along the channel
+        self.valve_ends, spans = [], {}
+        for _, v in self.valves.iterrows():
+            c = np.array([v["X (mm)"], v["Y (mm)"]])
+            r = locate(self.rects, c)
+            if r is None: continue
+            ax = self.axis(r)
+            lo, hi = self._node(v["Valve"]+'-'), self._node(v["Valve"]+'+')
+            half = v["Control Width (mm)"] / 2
+            d = np.eye(2)[ax] * half
+            pts[r] += [(*(c - d), lo), (*(c + d), hi)]
+            spans.setdefault(r, []).append((c[ax] - half, c[ax] + half, len(self.valve_ends)))
+            self.valve_ends.append((lo, hi))
+        # chain the nodes of every rectangle along its long axis
+        ei, ej, length, width, valve = [], [], [], [], []
+        for r, p in enumerate(pts):
+            if len(p) < 2: continue
+            ax = self.axis(r)
+            p = sorted(p, key=lambda q: q[ax])
+            w = self.short_side(r)
+            for a, b in zip(p[:-1], p[1:]):
+                if a[2] == b[2]: continue
+                ei.append(a[2]); ej.append(b[2])
+                length.append(max(abs(b[ax] - a[ax]), 1e-3 * w))
+                width.append(w)
+                mid = (a[ax] + b[ax]) / 2
+                valve.append(next((k for lo, hi, k in spans.get(r, []) if lo <= mid <= hi), -1))
+        self.ei, self.ej = np.array(ei), np.array(ej)
+        self.length, self.width, self.valve = np.array(length), np.array(width), np.array(valve)
+
+    def axis(self, r):
+        x0, y0, x1, y1 = self.rects[r]
+        return 0 if x1 - x0 >= y1 - y0 else 1
+
+    def short_side(self, r):
+        x0, y0, x1, y1 = self.rects[r]
+        return min(x1 - x0, y1 - y0)
+
+    # ========== Element Conductances ==========
+    def conductance(self, blocked, kind='ionic'):
+        # blocked: (S, n_valves) open-area fraction taken by the membrane;
+        # returns (S, n_edges). The membrane lowers the channel height.
+        blocked = np.atleast_2d(blocked)
+        h = np.full(blocked.shape[:1] + self.length.shape, self.height)
+        isv = self.valve >= 0
+        h[:, isv] *= 1 - np.clip(blocked[:, self.valve[isv]], 0, 1)
+        if kind == 'ionic':
+            return (self.width * h * 0.01) / (RHO * self.length * 0.1)     # S, lengths in cm
+        a, b = np.minimum(self.width, h) * 1e-3, np.maximum(self.width, h) * 1e-3
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g = a**3 * b * (1 - 0.63 * a / b) / (12 * MU * self.length * 1e-3)
+        return np.nan_to_num(np.maximum(g, 0))                            # m³/(Pa·s)
+
+    # ========== Batched Solve ==========
+    def reduce(self, kind='ionic'):
+        # Kron reduction of the fixed (non-valve) part onto terminals and
+        # valve ends with one sparse LU; valve edges are added per state.
+        # Returns (Lkk, eps, keep), keep maps a node to its row of Lkk
+        if kind in self._reduced: return self._reduced[kind]
+        g = self.conductance(np.zeros((1, len(self.valve_ends))), kind)[0]
+        fixed = self.valve < 0
+        n = len(self.names)
+        i, j, gf = self.ei[fixed], self.ej[fixed], g[fixed]
+        L = sp.coo_matrix((np.r_[gf, gf, -gf, -gf], (np.r_[i, j, i, j], np.r_[i, j, j, i])), shape=(n, n)).tocsc()
+        eps = 1e-12 * np.median(g)
+        L = L + eps * sp.identity(n, format='csc')
+        isv = self.valve >= 0
+        keep = np.array(sorted(set(self.terminals.values()) | set(self.ei[isv]) | set(self.ej[isv])))
+        inner = np.setdiff1d(np.arange(n), keep)
+        Lkk = L[keep][:, keep].toarray()
+        Lki = L[keep][:, inner]
+        if len(inner):
+            lu = splu(L[inner][:, inner].tocsc())
+            Lkk = Lkk - Lki @ lu.solve(Lki.T.toarray())
+        self._reduced[kind] = Lkk, eps, {int(k): a for a, k in enumerate(keep)}
+        return self._reduced[kind]
+
+    def resistance(self, blocked, pairs=None, kind='ionic'):
+        # blocked: (S, n_valves); returns (S, n_pairs) two-terminal
+        # resistances (Ohm for 'ionic', Pa·s/m³ for 'hydraulic')
+        blocked = np.atleast_2d(np.asarray(blocked, dtype=float))
+        K0, eps, keep = self.reduce(kind)
+        g = self.conductance(blocked, kind)
+        S, m = len(blocked), len(K0)
+        K = np.broadcast_to(K0, (S, m, m)).copy()
+        for e in np.flatnonzero(self.valve >= 0):
+            a, b = keep[int(self.ei[e])], keep[int(self.ej[e])]
+            K[:, a, a] += g[:, e]; K[:, b, b] += g[:, e]
+            K[:, a, b] -= g[:, e]; K[:, b, a] -= g[:, e]
+        if pairs is None: pairs = self.connected_pairs()
+        B = np.zeros((m, len(pairs)))
+        for c, (p, q) in enumerate(pairs):
+            B[keep[self.terminals[p]], c] += 1
+            B[keep[self.terminals[q]], c] -= 1
+        X = np.linalg.solve(K, np.broadcast_to(B, (S, m, len(pairs))))
+        R = np.einsum('spc,pc->sc', X, B)
+        # a path through closed valves only leaks through eps
+        R[R > 1e-3 / eps] = np.inf
+        return R, pairs
+
+    def connected_pairs(self):
+        # terminal pairs joined by channels when all valves are open
+        n = len(self.names)
+        A = sp.coo_matrix((np.ones(len(self.ei)), (self.ei, self.ej)), shape=(n, n))
+        comp = connected_components(A, directed=False)[1]
+        names = sorted(self.terminals, key=lambda t: (t[0], int(t[1:])))
+        return [(p, q) for a, p in enumerate(names) for q in names[a+1:]
+                if comp[self.terminals[p]] == comp[self.terminals[q]]]
+
+def resistance_table(net, states, kind='ionic'):
+    # states: {name: blocked fractions per valve}
+    R, pairs = net.resistance(np.array(list(states.values())), kind=kind)
+    unit = "Ohm" if kind == 'ionic' else "Pa·s/m³"
+    rows = [{"State": s, "From": p, "To": q, f"R ({unit})": R[k, c]}
+            for k, s in enumerate(states) for c, (p, q) in enumerate(pairs)]
+    return pd.DataFrame(rows)
+
+if __name__ == '__main__':
+    fc, cc = sys.argv[1:3] if len(sys.argv) > 2 else ('240821-fc.gds', '240821-cc.gds')
+    net = Network(fc, cc)
+    nv = len(net.valve_ends)
+    states = {"open": np.zeros(nv), "closed": np.ones(nv)}
+    states.update({f"{v} closed": np.eye(nv)[k] for k, v in enumerate(net.valves["Valve"][:nv])})
+    df = resistance_table(net, states)
+    print(df.to_string(index=False))
+    df.to_excel("network_resistance.xlsx", index=False)
+    print("[SAVED] Network resistances exported to: network_resistance.xlsx")
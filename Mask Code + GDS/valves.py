@@ -0,0 +1,60 @@
+import sys
+import numpy as np
+import pandas as pd
+
+from drc import load_shapes, crossings, is_channel, polygon_area
+
+# ========== Valve Crossing Extraction ==========
+# Every overlap of a flow channel (makech(which='fc')) with a control channel
+# (makech(which='cc')) is a valve. The overlap is measured in the frame of
+# the control channel: across it is the flow channel width (membrane span,
+# a = width/2), along it the control channel width (valve length l).
+# Layout units are mm; the channel height is not in the mask.
+
+CH_HEIGHT = 0.055 # mm, mould depth of the flow channels
+
+def channel_axis(pl):
+    # dominant direction of a straight channel polygon
+    d = pl - pl.mean(axis=0)
+    w, v = np.linalg.eigh(d.T @ d)
+    return v[:, np.argmax(w)]
+
+def extract_valves(fc, cc, height=CH_HEIGHT):
+    # fc, cc: GDS file names or GdsLibrary/Cell of the two layers
+    fl, fp = load_shapes(fc)
+    cl, cp = load_shapes(cc)
+    rows = []
+    for i, j, inter in crossings(fp, cp):
+        if not (is_channel(fl[i]) and is_channel(cl[j])): continue
+        pts = np.concatenate(inter)
+        u = channel_axis(cp[j])
+        v = np.array([-u[1], u[0]])
+        span = np.ptp(pts @ u)
+        length = np.ptp(pts @ v)
+        area = sum(polygon_area(q) for q in inter)
+        c = sum(polygon_area(q)*q.mean(axis=0) for q in inter) / area
+        rows.append({"X (mm)": c[0], "Y (mm)": c[1], "Area (mm²)": area,
+                     "Flow Width (mm)": span, "Control Width (mm)": length,
+                     "Height (mm)": height, "fc": fl[i], "cc": cl[j]})
+    df = pd.DataFrame(rows)
+    if len(df):
+        df = df.sort_values(["Y (mm)", "X (mm)"], ascending=[False, True]).reset_index(drop=True)
+        df.insert(0, "Valve", ["V%d" % (k+1) for k in range(len(df))])
+    return df
+
+def model_inputs(valves):
+    # cm based constants used by the blocked-area scripts, one row per valve
+    return pd.DataFrame({
+        "Valve": valves["Valve"],
+        "a (cm)": valves["Flow Width (mm)"] / 2 * 0.1,
+        "l (cm)": valves["Control Width (mm)"] * 0.1,
+        "A (cm²)": valves["Flow Width (mm)"] * valves["Height (mm)"] * 0.01,
+    })
+
+if __name__ == '__main__':
+    fc, cc = sys.argv[1:3] if len(sys.argv) > 2 else ('240821-fc.gds', '240821-cc.gds')
+    valves = extract_valves(fc, cc)
+    valves = valves.merge(model_inputs(valves), on="Valve")
+    valves.to_excel("valves.xlsx", index=False)
+    print(valves.to_string(index=False))
+    print(f"[SAVED] {len(valves)} valves exported to: valves.xlsx")
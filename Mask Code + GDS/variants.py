@@ -0,0 +1,80 @@
+import os
+import sys
+import itertools
+import importlib
+import contextlib
+import gdspy as gd
+from concurrent.futures import ProcessPoolExecutor
+
+# ========== Mask Variant Generator ==========
+# Writes every combination of a parameter grid for every layer. Keys of the
+# grid name attributes of the mask parameters, e.g.
+#   {'m.ch_w': [0.05, 0.075], 'p.nutgap': [10, 11], 'p.io_rows': [8, 10]}
+# Sub-cells (ports, crosses, booleaned channels, chambers) are cached in
+# each worker, and variants are handed out in grid order so neighbours that
+# share them land in the same worker.
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+mask = importlib.import_module('240821_mask')
+
+def expand_grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))]
+
+def variant_tag(variant):
+    return ''.join('-' + k.split('.')[-1].replace('_', '') + str(v) for k, v in variant.items())
+
+def apply_variant(variant):
+    spaces = {'p': mask.p, 'm': mask.m}
+    for k, v in variant.items():
+        ns, attr = k.split('.')
+        setattr(spaces[ns], attr, v)
+
+@contextlib.contextmanager
+def using_variant(variant):
+    defaults = {k: getattr({'p': mask.p, 'm': mask.m}[k.split('.')[0]], k.split('.')[1]) for k in variant}
+    apply_variant(variant)
+    try:
+        yield
+    finally:
+        apply_variant(defaults)
+
+def write_variant(job):
+    variant, layers, outdir = job
+    with using_variant(variant):
+        return [os.path.join(outdir, mask.flowcyto(layer, tag=variant_tag(variant), outdir=outdir)) for layer in layers]
+
+def write_wafer(grid, layer='fc', cols=4, pitch=None, fname=None):
+    # all variants of one layer as references on a single top cell; shared
+    # sub-cells are written once, so the file grows with unique geometry
+    variants = expand_grid(grid)
+    if pitch is None: pitch = (mask.p.chip_l+2, mask.p.chip_w+2)
+    wafer = gd.Cell('wafer')
+    for k, v in enumerate(variants):
+        with using_variant(v):
+            ident, top = mask.build_flowcyto(layer, tag=variant_tag(v))
+        wafer.add(gd.CellReference(top, ((k % cols)*pitch[0], -(k // cols)*pitch[1])))
+    fname = fname or '240821-wafer-'+layer+'.gds'
+    mask.write_cells([wafer], fname)
+    print(f"[SAVED] {len(variants)} chips on wafer: {fname}")
+    return fname
+
+def generate(grid, layers=('fc', 'cc'), outdir='variants', workers=None):
+    os.makedirs(outdir, exist_ok=True)
+    variants = expand_grid(grid)
+    jobs = [(v, layers, outdir) for v in variants]
+    if workers == 1:
+        files = [write_variant(j) for j in jobs]
+    else:
+        workers = workers or os.cpu_count()
+        chunk = max(1, len(jobs) // (4*workers))
+        with ProcessPoolExecutor(workers) as ex:
+            files = list(ex.map(write_variant, jobs, chunksize=chunk))
+    print(f"[SAVED] {len(variants)} variants x {len(layers)} layers to: {outdir}")
+    return dict(zip(map(variant_tag, variants), files))
+
+if __name__ == '__main__':
+    generate({'m.ch_w': [0.050, 0.075, 0.100],
+              'p.nutgap': [10, 11],
+              'p.io_rows': [8, 10],
+              'm.chamber': [0.100, 0.150]})
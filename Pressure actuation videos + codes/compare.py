@@ -0,0 +1,146 @@
+import os
+import sys
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from spectral import parse_drive, lockin
+
+# ========== Dataset Comparison ==========
+# Recordings are loaded from the deflection .xlsx exports, resampled onto a
+# common phase grid of the drive (so fps and drive frequency drop out) and
+# cut into whole cycles. Every cycle is then compared with the other
+# recording's median cycle, directly and with a banded DTW.
+
+N_PHASE = 100
+BAND = 0.1      # DTW band, fraction of a cycle
+
+def load_dataset(path, f0=None, column=None):
+    df = pd.read_excel(path)
+    if column is None:
+        cols = [c for c in df.columns if 'Deflection' in c and 'Smoothed' not in c]
+        column = cols[0]
+    t = df["Time (s)"].values.astype(float)
+    y = df[column].values.astype(float)
+    name = os.path.splitext(os.path.basename(path))[0]
+    fps = 1 / np.median(np.diff(t))
+    if f0 is None: f0 = parse_drive(name)[2]
+    if f0 is None: f0 = dominant_frequency(y, fps)
+    return {"name": name, "t": t, "y": y, "fps": fps, "f0": f0}
+
+def dominant_frequency(y, fps, min_cycles=3):
+    # strongest spectral line with at least min_cycles in the record
+    spec = np.abs(np.fft.rfft(y - y.mean()))
+    f = np.fft.rfftfreq(len(y), 1 / fps)
+    spec[f < min_cycles * fps / len(y)] = 0
+    return f[spec.argmax()]
+
+def fold_cycles(t, y, f0, n_phase=N_PHASE):
+    # (n_cycles, n_phase) array of whole cycles. Phase 0 is the peak of the
+    # fundamental, so recordings started at different times line up.
+    fs = 1 / np.median(np.diff(t))
+    amp, ph = lockin(y, fs, f0, harmonics=(1,))
+    cyc = (t - t[0]) * f0 + ph[0, 0] / (2 * np.pi)
+    first, last = int(np.ceil(cyc[0])), int(np.floor(cyc[-1]))
+    if last - first < 1: return np.empty((0, n_phase))
+    keep = (cyc >= first) & (cyc < last)
+    pos = ((cyc[keep] - first) * n_phase).astype(int)
+    size = (last - first) * n_phase
+    count = np.bincount(pos, minlength=size)
+    total = np.bincount(pos, weights=y[keep], minlength=size)
+    grid = np.arange(size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    # bins without a sample (drive faster than fps / n_phase) are interpolated
+    filled = count > 0
+    mean[~filled] = np.interp((grid[~filled] + 0.5) / n_phase, cyc[keep] - first, y[keep])
+    return mean.reshape(-1, n_phase)
+
+def dtw_distance(A, B, band=BAND):
+    # banded DTW for k pairs of rows at once, swept along anti-diagonals so
+    # the recursion is vectorized over pairs and cells; mean |a-b| on the path
+    A, B = np.atleast_2d(A), np.atleast_2d(B)
+    k, n = A.shape
+    m = B.shape[1]
+    cost = np.abs(A[:, :, None] - B[:, None, :])
+    i, j = np.indices((n, m))
+    cost[:, np.abs(i * (m / n) - j) > max(band * m, 1)] = np.inf
+    D = np.full((k, n+1, m+1), np.inf)
+    L = np.zeros((k, n+1, m+1))
+    D[:, 0, 0] = 0
+    for d in range(2, n+m+1):
+        ii = np.arange(max(1, d-m), min(n, d-1)+1)
+        jj = d - ii
+        prev = np.stack([D[:, ii-1, jj-1], D[:, ii-1, jj], D[:, ii, jj-1]])
+        plen = np.stack([L[:, ii-1, jj-1], L[:, ii-1, jj], L[:, ii, jj-1]])
+        best = prev.argmin(axis=0)
+        D[:, ii, jj] = cost[:, ii-1, jj-1] + np.take_along_axis(prev, best[None], 0)[0]
+        L[:, ii, jj] = np.take_along_axis(plen, best[None], 0)[0] + 1
+    return D[:, n, m] / L[:, n, m]
+
+# ========== Pairwise Statistics ==========
+def cycle_stats(cycles, template, band=BAND):
+    diff = cycles - template
+    return {"RMS Diff (px)": np.sqrt((diff**2).mean(axis=1)),
+            "Mean Diff (px)": diff.mean(axis=1),
+            "DTW Diff (px)": dtw_distance(cycles, np.broadcast_to(template, cycles.shape), band),
+            "Amplitude (px)": np.ptp(cycles, axis=1),
+            "Amplitude Ratio": np.ptp(cycles, axis=1) / max(np.ptp(template), 1e-12)}
+
+_folded = {}
+
+def _init(folded):
+    global _folded
+    _folded = folded
+
+def compare_pair(pair, band=BAND):
+    a, b = pair
+    ca, cb = _folded[a]["cycles"], _folded[b]["cycles"]
+    if len(ca) == 0 or len(cb) == 0: return []
+    ta, tb = np.median(ca, axis=0), np.median(cb, axis=0)
+    rows = []
+    for src, cyc, tpl in ((a, ca, tb), (b, cb, ta)):
+        st = cycle_stats(cyc, tpl, band)
+        for c in range(len(cyc)):
+            rows.append({"A": a, "B": b, "Level": "cycle", "Dataset": src, "Cycle": c+1,
+                         **{k: v[c] for k, v in st.items()}})
+    # dataset level: median cycles against each other plus cycle scatter
+    st = cycle_stats(ta[None], tb, band)
+    rows.append({"A": a, "B": b, "Level": "dataset", "Dataset": None, "Cycle": None,
+                 **{k: v[0] for k, v in st.items()},
+                 "Cycles A": len(ca), "Cycles B": len(cb),
+                 "Scatter A (px)": np.sqrt(((ca - ta)**2).mean()),
+                 "Scatter B (px)": np.sqrt(((cb - tb)**2).mean())})
+    return rows
+
+def _compare_chunk(pairs):
+    return [r for p in pairs for r in compare_pair(p)]
+
+def compare(datasets, pairs=None, workers=1, n_phase=N_PHASE, chunk=16):
+    # datasets: list of paths or already loaded dicts. pairs defaults to all
+    # unordered pairs; only the folded cycles are sent to the workers.
+    datasets = [d if isinstance(d, dict) else load_dataset(d) for d in datasets]
+    folded = {d["name"]: {"cycles": fold_cycles(d["t"], d["y"], d["f0"], n_phase)} for d in datasets}
+    if pairs is None: pairs = list(itertools.combinations(folded, 2))
+    jobs = [pairs[i:i+chunk] for i in range(0, len(pairs), chunk)]
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=_init, initargs=(folded,)) as ex:
+            parts = list(ex.map(_compare_chunk, jobs))
+    else:
+        _init(folded)
+        parts = [_compare_chunk(j) for j in jobs]
+    table = pd.DataFrame([r for p in parts for r in p])
+    info = pd.DataFrame([{"Dataset": d["name"], "fps": d["fps"], "Drive (Hz)": d["f0"],
+                          "Cycles": len(folded[d["name"]]["cycles"])} for d in datasets])
+    return table, info
+
+if __name__ == '__main__':
+    paths = sys.argv[1:]
+    table, info = compare(paths, workers=os.cpu_count() or 1)
+    print(info.to_string(index=False))
+    print(table[table["Level"] == "dataset"].dropna(axis=1, how='all').to_string(index=False))
+    with pd.ExcelWriter("comparison.xlsx") as w:
+        table.to_excel(w, sheet_name="Comparison", index=False)
+        info.to_excel(w, sheet_name="Datasets", index=False)
+    print("[SAVED] Comparison exported to: comparison.xlsx")
@@ -0,0 +1,86 @@
+import numpy as np
+
+# ========== Trace Decimation for Plotting ==========
+# Long 300 fps traces are reduced to about the plotted pixel width before
+# they reach matplotlib. 'minmax' keeps the envelope (every peak survives),
+# 'lttb' keeps the visual shape with one point per bucket.
+
+def _buckets(n, nb):
+    edges = np.linspace(0, n, nb+1).astype(int)
+    return edges[:-1], edges[1:]
+
+def minmax(x, y, n_out):
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    n = len(y)
+    nb = n_out // 2
+    if nb < 1 or n <= n_out: return x, y
+    k = -(-n // nb)
+    pad = nb*k - n
+    yp = np.concatenate([y, np.full(pad, np.nan)]).reshape(nb, k)
+    valid = ~np.all(np.isnan(yp), axis=1)
+    yp = np.where(np.isnan(yp), np.inf, yp)
+    imin = yp.argmin(axis=1)
+    imax = np.where(np.isinf(yp), -np.inf, yp).argmax(axis=1)
+    base = np.arange(nb) * k
+    idx = np.sort(np.stack([base+imin, base+imax], axis=1)[valid], axis=1).ravel()
+    idx = idx[np.r_[True, idx[1:] != idx[:-1]]]
+    return x[idx], y[idx]
+
+def lttb(x, y, n_out):
+    # largest-triangle-three-buckets; the loop runs once per output point,
+    # the work inside is vectorized over the bucket
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out < 3 or n <= n_out: return x, y
+    lo, hi = _buckets(n-2, n_out-2)
+    lo, hi = lo+1, hi+1
+    # bucket means used as the third point of each triangle
+    cs_x, cs_y = np.r_[0, np.cumsum(x)], np.r_[0, np.cumsum(y)]
+    nxt_lo, nxt_hi = np.r_[lo[1:], n-1], np.r_[hi[1:], n]
+    mx = (cs_x[nxt_hi]-cs_x[nxt_lo]) / (nxt_hi-nxt_lo)
+    my = (cs_y[nxt_hi]-cs_y[nxt_lo]) / (nxt_hi-nxt_lo)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n-1
+    a = 0
+    for b in range(n_out-2):
+        sx, sy = x[lo[b]:hi[b]], y[lo[b]:hi[b]]
+        area = np.abs((x[a]-mx[b])*(sy-y[a]) - (x[a]-sx)*(my[b]-y[a]))
+        a = lo[b] + int(area.argmax())
+        idx[b+1] = a
+    return x[idx], y[idx]
+
+MODES = {'minmax': minmax, 'lttb': lttb}
+
+def decimate(x, y, n_out, mode='minmax'):
+    return MODES[mode](x, y, n_out)
+
+class MinMaxStream:
+    # min-max envelope over fixed-size buckets for data arriving in chunks;
+    # add() returns the finished points, flush() the last partial bucket
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.x, self.y = np.empty(0), np.empty(0)
+
+    def add(self, x, y):
+        self.x = np.concatenate([self.x, np.asarray(x, dtype=float)])
+        self.y = np.concatenate([self.y, np.asarray(y, dtype=float)])
+        m = len(self.y) // self.bucket * self.bucket
+        if m == 0: return np.empty(0), np.empty(0)
+        out = minmax(self.x[:m], self.y[:m], 2*(m // self.bucket)) if self.bucket > 2 else (self.x[:m], self.y[:m])
+        self.x, self.y = self.x[m:], self.y[m:]
+        return out
+
+    def flush(self):
+        out = minmax(self.x, self.y, 2) if len(self.y) > 2 else (self.x, self.y)
+        self.x, self.y = np.empty(0), np.empty(0)
+        return out
+
+def axes_width(ax):
+    # plotted width in device pixels (figure dpi, so it follows savefig dpi)
+    return max(int(ax.get_window_extent().width), 100)
+
+def plot(ax, x, y, *args, mode='minmax', width=None, **kwargs):
+    # drop-in for ax.plot(x, y, ...) with decimation to the axes width
+    n_out = 2*(width or axes_width(ax))
+    xd, yd = decimate(np.asarray(x), np.asarray(y), n_out, mode)
+    return ax.plot(xd, yd, *args, **kwargs)
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import numpy as np
+
+from framesource import FrameSource, BACKEND
+
+# ========== ROI Frame Store ==========
+# Decodes a video once into a raw uint8 file of grayscale ROI crops
+# (N x H x W) next to the video, plus a small .json with the shape and ROI.
+# Threshold studies then run on the memory-mapped crops without decoding.
+
+def store_paths(fname, tag='roi'):
+    return fname + '.' + tag + '.u8', fname + '.' + tag + '.json'
+
+def build_store(fname, roi, start=10, tag='roi', backend=None):
+    p1, p2, p3, p4 = roi
+    raw, meta = store_paths(fname, tag)
+    box = (p1[0], p2[1], p2[0]-p1[0]+1, p1[1]-p2[1]+1)
+    n, shape = 0, None
+    with open(raw, 'wb') as f, FrameSource(fname, box=box, start=start, backend=backend) as src:
+        for i, gray in src:
+            shape = gray.shape
+            f.write(gray.data)
+            n += 1
+    st = os.stat(fname)
+    info = {'video_size': st.st_size, 'video_mtime': st.st_mtime, 'roi': [list(x) for x in roi],
+            'start': start, 'backend': backend or BACKEND, 'shape': [n] + list(shape or (0, 0))}
+    with open(meta, 'w') as f: json.dump(info, f)
+    return load_store(fname, tag)
+
+def load_store(fname, tag='roi'):
+    raw, meta = store_paths(fname, tag)
+    with open(meta) as f: info = json.load(f)
+    frames = np.memmap(raw, dtype=np.uint8, mode='r', shape=tuple(info['shape']))
+    framenos = info['start'] + 1 + np.arange(info['shape'][0])
+    return frames, framenos
+
+def open_store(fname, roi, start=10, tag='roi', backend=None):
+    # reuse the store if it was made from the same video, ROI, start frame
+    # and decoder
+    raw, meta = store_paths(fname, tag)
+    if os.path.exists(raw) and os.path.exists(meta):
+        with open(meta) as f: info = json.load(f)
+        st = os.stat(fname)
+        if (info['video_size'] == st.st_size and info['video_mtime'] == st.st_mtime
+                and info['roi'] == [list(x) for x in roi] and info['start'] == start
+                and info.get('backend') == (backend or BACKEND)):
+            return load_store(fname, tag)
+    return build_store(fname, roi, start, tag, backend)
+
+# ========== Vectorized Scan-line Measurement ==========
+def scan_geometry(roi, shape):
+    # same centre-line choice as get_size(): returns axis of the scan line,
+    # the fixed index across it and the start index along it
+    p1, p2, p3, p4 = roi
+    h, w = shape
+    if abs(p3[1]-p4[1]) < abs(p3[0]-p4[0]):
+        y0 = int(((p3[1]-p2[1]) + (p4[1]-p2[1])) / 2)
+        x0 = int((p4[0]-p3[0])/2)
+        return 'row', min(max(y0, 0), h-1), min(max(x0, 0), w-1)
+    x0 = abs(int(((p3[0]-p1[0]) + (p4[0]-p1[0])) / 2))
+    y0 = abs(int((p4[1]-p3[1]) / 2))
+    return 'col', min(x0, w-1), min(y0, h-1)
+
+def scan_lines(frames, roi):
+    axis, idx, s0 = scan_geometry(roi, frames.shape[1:])
+    lines = frames[:, idx, :] if axis == 'row' else frames[:, :, idx]
+    return np.asarray(lines), s0
+
+def gap_width(bright, s0):
+    # bright: (..., L) bool. Walks out from s0 to the first bright pixel on
+    # each side, exactly like the while-loops in get_size().
+    L = bright.shape[-1]
+    left = bright[..., :s0+1][..., ::-1]
+    right = bright[..., s0:]
+    x1 = np.where(left.any(-1), s0 - left.argmax(-1), 0)
+    x2 = np.where(right.any(-1), s0 + right.argmax(-1), L-1)
+    return x2 - x1
+
+def threshold_sweep(frames, roi, thresholds, chunk=8192):
+    # deflection for every threshold at once: result is (n_thresholds, N)
+    lines, s0 = scan_lines(frames, roi)
+    thr = np.asarray(thresholds)[:, None, None]
+    out = np.empty((thr.shape[0], lines.shape[0]), dtype=int)
+    for i in range(0, lines.shape[0], chunk):
+        out[:, i:i+chunk] = gap_width(lines[None, i:i+chunk] > thr, s0)
+    return out
+
+def otsu_thresholds(frames, chunk=1024):
+    # per-frame Otsu threshold from batched 256-bin histograms
+    n = frames.shape[0]
+    out = np.empty(n)
+    levels = np.arange(256)
+    for i in range(0, n, chunk):
+        blk = np.asarray(frames[i:i+chunk]).reshape(-1, frames.shape[1]*frames.shape[2])
+        k = blk.shape[0]
+        # float64: the int64 products below overflow for crops over ~10k px
+        hist = np.bincount((np.arange(k)[:, None]*256 + blk).ravel(), minlength=k*256).reshape(k, 256).astype(np.float64)
+        w0 = np.cumsum(hist, axis=1)
+        mu = np.cumsum(hist * levels, axis=1)
+        wt, mt = w0[:, -1:], mu[:, -1:]
+        w1 = wt - w0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            between = (mt*w0 - mu*wt)**2 / (w0 * w1)
+        between[~np.isfinite(between)] = -1
+        out[i:i+k] = between.argmax(axis=1)
+    return out
+
+# ========== Vectorized Gap Area ==========
+AREA_FIELDS = ("Area (px2)", "Centroid X (px)", "Centroid Y (px)", "Extent (px)")
+
+def gap_area(frames, roi, thresh, origin=(0, 0), step=2, chunk=8192):
+    # the open gap around the scan line instead of one line of it: every
+    # line parallel to the scan line is walked out from the same seed to the
+    # first bright (> thresh) wall on each side, like gap_width(). The gap is
+    # the run of lines through the scan line that are closed on both sides
+    # and whose walls open out by at most step px per line (past that it has
+    # run into the dark background). Returns (N, 4) as AREA_FIELDS, centroid
+    # in frame pixels, extent along the scan axis
+    n = frames.shape[0]
+    axis, idx, s0 = scan_geometry(roi, frames.shape[1:])
+    out = np.empty((n, 4))
+    for i in range(0, n, chunk):
+        blk = np.asarray(frames[i:i+chunk])
+        if axis == 'col': blk = blk.transpose(0, 2, 1)
+        bright = blk > thresh
+        m, L = bright.shape[1:]
+        left, right = bright[..., :s0+1][..., ::-1], bright[..., s0:]
+        x1, x2 = s0 - left.argmax(-1), s0 + right.argmax(-1)
+        ok = left.any(-1) & right.any(-1) & ~bright[..., s0]
+        ok[:, :idx] &= (x1[:, :idx] >= x1[:, 1:idx+1] - step) & (x2[:, :idx] <= x2[:, 1:idx+1] + step)
+        ok[:, idx+1:] &= (x1[:, idx+1:] >= x1[:, idx:-1] - step) & (x2[:, idx+1:] <= x2[:, idx:-1] + step)
+        j = np.arange(m)
+        above = np.where(ok[:, :idx+1], -1, j[:idx+1]).max(axis=1)
+        below = np.where(ok[:, idx:], m, j[idx:]).min(axis=1)
+        inside = (j > above[:, None]) & (j < below[:, None])
+        w = np.where(inside, x2 - x1, 0)
+        area = w.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            along = (w * (x1 + x2) / 2).sum(axis=1) / area
+            across = w @ j / area
+        lo, hi = np.where(inside, x1, L).min(axis=1), np.where(inside, x2, -1).max(axis=1)
+        cx, cy = (along, across) if axis == 'row' else (across, along)
+        out[i:i+chunk, 0] = area
+        out[i:i+chunk, 1] = cx + origin[0]
+        out[i:i+chunk, 2] = cy + origin[1]
+        out[i:i+chunk, 3] = np.where(area > 0, hi - lo, 0)
+    return out
+
+def otsu_deflection(frames, roi):
+    lines, s0 = scan_lines(frames, roi)
+    thr = otsu_thresholds(frames)
+    return gap_width(lines > thr[:, None], s0), thr
+
+# ========== Checks on the Shipped Recording ==========
+CHECK_VIDEO = "10k device 0.5bar  10hz.264"
+CHECK_ROI = ((220, 260), (320, 120), (220, 190), (320, 190))   # valve at the channel crossing
+
+def check(fname=CHECK_VIDEO, roi=CHECK_ROI, n=500):
+    import cv2
+    p1, p2, p3, p4 = roi
+    box = (p1[0], p2[1], p2[0]-p1[0]+1, p1[1]-p2[1]+1)
+    with FrameSource(fname, box=box, start=10) as src:
+        frames = np.stack([gray.copy() for i, gray in src])
+    # batched Otsu against OpenCV's on the same crops
+    ref = np.array([cv2.threshold(f, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[0] for f in frames[:n]])
+    assert np.array_equal(otsu_thresholds(frames[:n]), ref), "otsu_thresholds differs from cv2 THRESH_OTSU"
+    print(f"[CHECK] Otsu matches cv2 on {n} frames of {fname}")
+    # the gap area has to follow the scan-line width, not the background
+    width = threshold_sweep(frames, roi, [220])[0].astype(float)
+    area = gap_area(frames, roi, 220)
+    smooth = lambda x: np.convolve(x, np.ones(9)/9, mode='valid')
+    r_area, r_ext = (np.corrcoef(smooth(width), smooth(area[:, k]))[0, 1] for k in (0, 3))
+    assert area[:, 0].mean() < 0.2*frames.shape[1]*frames.shape[2], "gap area fills the crop"
+    assert r_area > 0.5 and r_ext > 0.5, f"gap area does not track the scan line (r = {r_area:.2f}, {r_ext:.2f})"
+    print(f"[CHECK] gap area {area[:, 0].mean():.0f} px, r = {r_area:.2f} (area) / {r_ext:.2f} (extent) against the scan-line width")
+
+if __name__ == '__main__':
+    check(*sys.argv[1:2])
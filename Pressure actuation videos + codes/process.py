@@ -1,15 +1,19 @@
 import os
+import sys
 import pdb
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.interpolate import make_interp_spline
 from scipy.signal import savgol_filter
+from framestore import open_store, threshold_sweep, otsu_deflection, gap_area
+from roi import ROI, as_rois, select_rois, measure_rois, measure_table, measure_adaptive
+import decimate
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Mask Code + GDS"))
+from calibration import load_calibration
 
 # ========== Global Settings ==========
-state = 0
-p1, p2 = None, None
-p3, p4 = None, None
 data = {}
 
 # ========== Helper Functions ==========
@@ -27,82 +31,52 @@ def disp_objects(thresh):
         cv2.drawContours(orig, [box.astype("int")], -1, (0, 255, 0), 2)
         print(box)
 
-def get_size(img):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    ret, thresh = cv2.threshold(gray, 220, 255, 0)
-
-    if abs(p3[1]-p4[1]) < abs(p3[0]-p4[0]):
-        y0 = int(((p3[1]-p2[1]) + (p4[1]-p2[1])) / 2)
-        x0 = int((p4[0]-p3[0])/2)
-        row = thresh[y0]
-        x1, x2 = x0, x0
-        while x1 > 0 and row[x1] == 0: x1 -= 1
-        while x2 < len(row)-1 and row[x2] == 0: x2 += 1
-        return (x2 - x1)
-    else:
-        x0 = abs(int(((p3[0]-p1[0]) + (p4[0]-p1[0])) / 2))
-        y0 = abs(int((p4[1]-p3[1]) / 2))
-        col = thresh[:, x0]
-        y1, y2 = y0, y0
-        while y1 > 0 and col[y1] == 0: y1 -= 1
-        while y2 < len(col)-1 and col[y2] == 0: y2 += 1
-        return abs(y2 - y1)
-
-def deflectionpixels(fname, roi=None):
-    global state, p1, p2, p3, p4
-    cap = cv2.VideoCapture(fname)
-    cv2.namedWindow('Frame', cv2.WINDOW_NORMAL)
-
-    def on_mouse(event, x, y, flags, userdata):
-        global state, p1, p2, p3, p4
-        if event == cv2.EVENT_LBUTTONUP:
-            if state == 0: p1 = (x, y); state += 1
-            elif state == 1: p2 = (x, y); state += 1
-            elif state == 2: p3 = (x, y); state += 1
-            elif state == 3: p4 = (x, y); state += 1
-        if event == cv2.EVENT_RBUTTONUP:
-            p1, p2, p3, p4 = None, None, None, None
-            state = 0
-
-    cv2.setMouseCallback('Frame', on_mouse)
-
-    if roi is None:
-        i = 0
-        while cap.isOpened():
-            i += 1
-            ret, frame = cap.read()
-            if i < 100: continue
-            if not ret: break
-            if state > 3:
-                print("Selected ROI:", p1, p2, p3, p4)
-                state = 0
-                break
-            cv2.imshow('Frame', frame)
-            if cv2.waitKey(1000) == ord('q'): break
-    else:
-        p1, p2, p3, p4 = roi
-    cv2.destroyAllWindows()
-
-    dat = [[], []]
-    frameno = 10
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frameno)
-    while cap.isOpened():
-        frameno += 1
-        ret, frame = cap.read()
-        if not ret: break
-        d = get_size(frame[p2[1]:p1[1]+1, p1[0]:p2[0]+1, :])
-        dat[0].append(frameno)
-        dat[1].append(d)
-
-    cap.release()
-    return dat
+def deflectionpixels(fname, roi=None, store=False, mode='scan', stride=1, tol=1):
+    # roi: ROI object or (p1, p2, p3, p4); selected by clicking when None.
+    # mode 'area' gives [area, centroid x, centroid y, extent] per frame.
+    # stride > 1 samples the scan line adaptively (full rate only where it
+    # moves more than tol px) and interpolates the rest
+    rois = as_rois(roi) or select_rois(fname, 1, skip=100, wait=1000)
+    if not rois: return [[], []]
+    r = rois[0]
+
+    if store:
+        # decode once into the ROI store, later runs reuse it
+        frames, framenos = open_store(fname, r.points, start=10)
+        if mode == 'area':
+            return [framenos.tolist(), gap_area(frames, r.points, r.thresh, r.box[:2]).tolist()]
+        return [framenos.tolist(), threshold_sweep(frames, r.points, [r.thresh])[0].tolist()]
+
+    if stride > 1 and mode == 'scan':
+        framenos, values, measured = measure_adaptive(fname, [r], start=10, stride=stride, tol=tol)
+        print(f"[ADAPTIVE] measured {measured.sum()} of {len(measured)} frames")
+        return [framenos.tolist(), values[:, 0].tolist()]
+
+    framenos, values = measure_rois(fname, [r], start=10, mode=mode)
+    return [framenos.tolist(), values[:, 0].tolist()]
+
+def deflection_table(fname, rois=None, n=1, fps=300, mode='scan'):
+    # any number of valves from one decode pass, one column per ROI
+    rois = as_rois(rois) or select_rois(fname, n, skip=100, wait=1000)
+    return measure_table(fname, rois, start=10, fps=fps, mode=mode)
+
+def threshold_study(fname, roi, thresholds=range(150, 250, 10)):
+    # deflection for each threshold (rows) and the per-frame Otsu estimate
+    roi = as_rois(roi)[0].points
+    frames, framenos = open_store(fname, roi, start=10)
+    sweep = threshold_sweep(frames, roi, list(thresholds))
+    otsu, otsu_thr = otsu_deflection(frames, roi)
+    return framenos, sweep, otsu, otsu_thr
 
 def gen_actuation_plots(data, fps=300):
     fig, axs = plt.subplots(1, 1, layout='constrained')
     fig.set_size_inches(6, 4)
     fig.set_dpi(300)
 
-    shiftx = [123, 22, 0, 75]
+    # frame offsets of the vids['10k'] raw .264 recordings. Frame k is now
+    # labelled k+1; the old reader could not seek these and started at
+    # frame 0 labelled 11, so the offsets tuned on it move down by 10
+    shiftx = [113, 12, -10, 65]
     shifty = [0, 50, 20, 80]
     i = 0
     for v in data.keys():
@@ -113,7 +87,7 @@ def gen_actuation_plots(data, fps=300):
         ynew = np.max(ynew) - ynew + 1
         ynew = [x + shifty[i] for x in ynew]
 
-        axs.plot(times_ms, ynew, label=os.path.basename(v)[:25], alpha=0.5, lw=1.5)
+        decimate.plot(axs, times_ms, ynew, label=os.path.basename(v)[:25], alpha=0.5, lw=1.5)
         i += 1
 
     axs.set_xlabel('Time (ms)')
@@ -124,12 +98,24 @@ def gen_actuation_plots(data, fps=300):
     plt.show()
 
 
-def collect_data():
+def collect_data(valve=None):
+    # valve: name of the calibrated ROI to measure (see <video>.calib.json);
+    # may be left out when the calibration suggests a single valve
     from vidnames import vids
     global data
     for v in vids['10k']:
-        print(f"\nSelect ROI for: {os.path.basename(v[0])}")
-        data[v[0]] = deflectionpixels(v[0], roi=None)
+        cal = load_calibration(v[0])
+        rois = cal.get('rois', {}) if cal else {}
+        roi = None
+        if valve in rois:
+            roi = ROI(*rois[valve], name=valve)
+        elif valve is None and len(rois) == 1:
+            name, pts = next(iter(rois.items()))
+            roi = ROI(*pts, name=name)
+        else:
+            if rois: print(f"Calibrated valves: {', '.join(rois)}")
+            print(f"\nSelect ROI for: {os.path.basename(v[0])}")
+        data[v[0]] = deflectionpixels(v[0], roi=roi)
 
 # Run the full process
 collect_data()
@@ -0,0 +1,204 @@
+import cv2
+import numpy as np
+import pandas as pd
+
+from framesource import FrameSource
+from framestore import AREA_FIELDS, gap_area
+
+# ========== Per-ROI Measurement ==========
+THRESH = 220
+
+class ROI:
+    # p1 bottom-left and p2 top-right corner of the crop, p3-p4 the line
+    # across the membrane gap, all in frame pixels (click order of the GUI)
+    def __init__(self, p1, p2, p3, p4, name=None, thresh=THRESH):
+        self.p1, self.p2, self.p3, self.p4 = (tuple(int(v) for v in q) for q in (p1, p2, p3, p4))
+        self.name = name
+        self.thresh = thresh
+
+    @property
+    def points(self):
+        return self.p1, self.p2, self.p3, self.p4
+
+    @property
+    def box(self):
+        # (x, y, w, h) of the crop
+        return self.p1[0], self.p2[1], self.p2[0]-self.p1[0]+1, self.p1[1]-self.p2[1]+1
+
+    @property
+    def horizontal(self):
+        # True when the p3-p4 line runs along x, i.e. the gap is measured in x
+        return abs(self.p3[1]-self.p4[1]) < abs(self.p3[0]-self.p4[0])
+
+    def shifted(self, dx, dy):
+        # the scan line only depends on point differences, so a shifted ROI
+        # measures the same on a frame cropped by (dx, dy)
+        return ROI(*((x-dx, y-dy) for x, y in self.points), name=self.name, thresh=self.thresh)
+
+    def crop(self, frame):
+        return frame[self.p2[1]:self.p1[1]+1, self.p1[0]:self.p2[0]+1]
+
+    def scan(self, thresh):
+        # width of the dark gap on the centre scan line of a binary crop
+        p1, p2, p3, p4 = self.points
+        if self.horizontal:
+            y0 = int(((p3[1]-p2[1]) + (p4[1]-p2[1])) / 2)
+            x0 = int((p4[0]-p3[0])/2)
+            row = thresh[y0]
+            x1, x2 = x0, x0
+            while x1 > 0 and row[x1] == 0: x1 -= 1
+            while x2 < len(row)-1 and row[x2] == 0: x2 += 1
+            return (x2 - x1)
+        else:
+            x0 = abs(int(((p3[0]-p1[0]) + (p4[0]-p1[0])) / 2))
+            y0 = abs(int((p4[1]-p3[1]) / 2))
+            col = thresh[:, x0]
+            y1, y2 = y0, y0
+            while y1 > 0 and col[y1] == 0: y1 -= 1
+            while y2 < len(col)-1 and col[y2] == 0: y2 += 1
+            return abs(y2 - y1)
+
+    def measure(self, frame):
+        # frame: BGR or grayscale
+        img = self.crop(frame)
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        ret, thresh = cv2.threshold(gray, self.thresh, 255, 0)
+        return self.scan(thresh)
+
+    def __repr__(self):
+        return f"ROI({self.name!r}, {self.p1}, {self.p2}, {self.p3}, {self.p4})"
+
+def as_rois(rois):
+    # accepts one ROI, one (p1, p2, p3, p4) tuple, a list or a {name: roi} dict
+    if rois is None: return None
+    if isinstance(rois, ROI): rois = [rois]
+    elif isinstance(rois, dict): rois = [r if isinstance(r, ROI) else ROI(*r, name=k) for k, r in rois.items()]
+    elif not any(isinstance(r, ROI) for r in rois) and np.shape(rois) == (4, 2): rois = [ROI(*rois)]
+    out = [r if isinstance(r, ROI) else ROI(*r) for r in rois]
+    for k, r in enumerate(out):
+        if r.name is None: r.name = f"ROI {k+1}"
+    return out
+
+# ========== Interactive Selection ==========
+def select_rois(fname, n=1, skip=0, wait=1):
+    # 4 left clicks per ROI (p1, p2, p3, p4), right click restarts the
+    # current ROI, 'q' stops early
+    clicks, rois = [], []
+
+    def on_mouse(event, x, y, flags, userdata):
+        if event == cv2.EVENT_LBUTTONUP:
+            clicks.append((x, y))
+            if len(clicks) == 4:
+                rois.append(ROI(*clicks, name=f"ROI {len(rois)+1}"))
+                print("Selected ROI:", rois[-1])
+                clicks.clear()
+        if event == cv2.EVENT_RBUTTONUP:
+            clicks.clear()
+
+    cap = cv2.VideoCapture(fname)
+    cv2.namedWindow('Frame', cv2.WINDOW_NORMAL)
+    cv2.setMouseCallback('Frame', on_mouse)
+    i = 0
+    while cap.isOpened() and len(rois) < n:
+        i += 1
+        ret, frame = cap.read()
+        if i < skip: continue
+        if not ret: break
+        cv2.imshow('Frame', frame)
+        if cv2.waitKey(wait) & 0xFF == ord('q'): break
+    cap.release()
+    cv2.destroyAllWindows()
+    return rois
+
+# ========== Single-pass Measurement ==========
+def union_box(rois):
+    boxes = np.array([r.box for r in rois])
+    x0, y0 = boxes[:, 0].min(), boxes[:, 1].min()
+    x1, y1 = (boxes[:, 0]+boxes[:, 2]).max(), (boxes[:, 1]+boxes[:, 3]).max()
+    return int(x0), int(y0), int(x1-x0), int(y1-y0)
+
+def _area_pass(src, rois, local, chunk):
+    # crops are gathered into (chunk, h, w) batches and reduced with NumPy
+    framenos, out, bufs, k = [], [], None, 0
+    def flush(k):
+        out.append(np.stack([gap_area(b[:k], r.points, r.thresh, r.box[:2])
+                             for b, r in zip(bufs, rois)], axis=1))
+    for i, gray in src:
+        if bufs is None: bufs = [np.empty((chunk,) + r.crop(gray).shape, np.uint8) for r in local]
+        for b, r in zip(bufs, local): b[k] = r.crop(gray)
+        framenos.append(i+1)
+        k += 1
+        if k == chunk:
+            flush(k)
+            k = 0
+    if k: flush(k)
+    return framenos, np.concatenate(out) if out else np.empty((0, len(rois), len(AREA_FIELDS)))
+
+def measure_rois(fname, rois, start=10, backend=None, mode='scan', chunk=256):
+    # decodes every frame once, as grayscale cropped to the ROIs, and
+    # measures all ROIs on it. mode 'scan' returns frame numbers and an
+    # (N, n_rois) array of scan-line widths, 'area' an (N, n_rois, 4) array
+    # of AREA_FIELDS
+    rois = as_rois(rois)
+    box = union_box(rois)
+    local = [r.shifted(box[0], box[1]) for r in rois]
+    with FrameSource(fname, box=box, start=start, backend=backend) as src:
+        if mode == 'area':
+            framenos, values = _area_pass(src, rois, local, chunk)
+        else:
+            framenos, values = [], []
+            for i, gray in src:
+                framenos.append(i+1)
+                values.append([r.measure(gray) for r in local])
+            values = np.array(values, dtype=int).reshape(-1, len(rois))
+    return np.array(framenos), values
+
+# ========== Motion-adaptive Sampling ==========
+def measure_adaptive(fname, rois, start=10, stride=10, tol=1, backend=None):
+    # measures every stride-th frame; where any ROI moved by more than tol
+    # px between two samples, the frames in between (kept as crops in a ring
+    # buffer) are measured too. Flat intervals are filled linearly, so the
+    # error there is at most tol px wherever the deflection is monotone
+    # between samples, i.e. for motion slower than stride frames.
+    # Returns frame numbers, an (N, n_rois) float array and the measured mask.
+    rois = as_rois(rois)
+    box = union_box(rois)
+    local = [r.shifted(box[0], box[1]) for r in rois]
+    framenos, values, ring, last = [], [], None, None
+    with FrameSource(fname, box=box, start=start, backend=backend) as src:
+        for pos, (i, gray) in enumerate(src):
+            if ring is None: ring = np.empty((stride,) + gray.shape, np.uint8)
+            ring[pos % stride] = gray
+            framenos.append(i+1)
+            values.append(None)
+            if pos % stride: continue
+            v = np.array([r.measure(gray) for r in local], dtype=float)
+            values[pos] = v
+            if last is not None and np.abs(v - last).max() > tol:
+                for q in range(pos-stride+1, pos):
+                    values[q] = np.array([r.measure(ring[q % stride]) for r in local], dtype=float)
+            last = v
+    # frames after the last sample have no end point, measure them all
+    n = len(values)
+    for q in range(n - (n-1) % stride if n else 0, n):
+        values[q] = np.array([r.measure(ring[q % stride]) for r in local], dtype=float)
+    measured = np.array([v is not None for v in values], dtype=bool)
+    out = np.full((n, len(rois)), np.nan)
+    if measured.any():
+        out[measured] = np.array([v for v in values if v is not None])
+        idx = np.arange(n)
+        for k in range(len(rois)):
+            out[:, k] = np.interp(idx, idx[measured], out[measured, k])
+    return np.array(framenos), out, measured
+
+def measure_table(fname, rois, start=10, fps=None, mode='scan'):
+    rois = as_rois(rois)
+    framenos, values = measure_rois(fname, rois, start, mode=mode)
+    if mode == 'area':
+        df = pd.DataFrame(values.reshape(len(values), -1),
+                          columns=[f"{r.name} {f}" for r in rois for f in AREA_FIELDS])
+    else:
+        df = pd.DataFrame(values, columns=[r.name for r in rois])
+    df.insert(0, "Frame", framenos)
+    if fps: df.insert(1, "Time (s)", framenos / fps)
+    return df
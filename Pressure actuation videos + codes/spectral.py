@@ -0,0 +1,94 @@
+import re
+import numpy as np
+import pandas as pd
+from scipy.signal import welch
+
+# ========== Spectral / Lock-in Analysis ==========
+# All functions take traces as (n_traces, n_samples) arrays (a single 1-D
+# trace is treated as one row) so many recordings are handled in one call.
+
+def as_traces(x):
+    x = np.asarray(x, dtype=float)
+    return x[None, :] if x.ndim == 1 else x
+
+def parse_drive(name):
+    # pulls device, pressure and drive frequency out of names like
+    # "8k device 0.5bar 0.5Hz 1000ms half a cycle.h264"
+    dev = re.search(r'(\d+k)\s*device', name, re.I)
+    bar = re.search(r'(\d+(?:\.\d+)?)\s*bar', name, re.I)
+    hz = re.search(r'(\d+(?:\.\d+)?)\s*hz', name, re.I)
+    return (dev.group(1).lower() if dev else None,
+            float(bar.group(1)) if bar else None,
+            float(hz.group(1)) if hz else None)
+
+def psd(traces, fs, nperseg=None):
+    x = as_traces(traces)
+    if nperseg is None: nperseg = min(x.shape[-1], 4096)
+    f, pxx = welch(x, fs=fs, nperseg=nperseg, axis=-1, detrend='constant')
+    return f, pxx
+
+class LockIn:
+    # Quadrature demodulation at f0 and its harmonics. update() can be fed
+    # consecutive chunks of a long series, memory stays O(n_traces*n_harm).
+    def __init__(self, fs, f0, harmonics=(1, 2, 3)):
+        self.fs = fs
+        self.freqs = f0 * np.asarray(harmonics, dtype=float)
+        self.n = 0
+        self.s = None
+        self.sum_x = None
+        self.sum_ref = np.zeros(len(self.freqs), dtype=complex)
+
+    def update(self, chunk):
+        x = as_traces(chunk)
+        m = x.shape[-1]
+        t = (self.n + np.arange(m)) / self.fs
+        ref = np.exp(-2j * np.pi * self.freqs[:, None] * t)
+        if self.s is None:
+            self.s = np.zeros((x.shape[0], len(self.freqs)), dtype=complex)
+            self.sum_x = np.zeros(x.shape[0])
+        self.s += x @ ref.T
+        self.sum_x += x.sum(axis=-1)
+        self.sum_ref += ref.sum(axis=-1)
+        self.n += m
+        return self
+
+    def result(self):
+        # the DC term is removed exactly, so partial cycles do not leak offset
+        mean = self.sum_x / self.n
+        z = 2 * (self.s - mean[:, None] * self.sum_ref[None, :]) / self.n
+        return np.abs(z), np.angle(z)
+
+def lockin(traces, fs, f0, harmonics=(1, 2, 3), whole_cycles=True):
+    x = as_traces(traces)
+    if whole_cycles:
+        ncyc = int(x.shape[-1] * f0 / fs)
+        if ncyc > 0: x = x[:, :int(round(ncyc * fs / f0))]
+    return LockIn(fs, f0, harmonics).update(x).result()
+
+def lockin_stream(chunks, fs, f0, harmonics=(1, 2, 3)):
+    li = LockIn(fs, f0, harmonics)
+    for c in chunks: li.update(c)
+    return li.result()
+
+def response_table(records, fs, harmonics=(1, 2, 3)):
+    # records: {name: (conductance, deflection)} sampled at fs. The drive
+    # frequency, device and pressure are taken from each name.
+    rows = []
+    for name, (cond, defl) in records.items():
+        dev, bar, f0 = parse_drive(name)
+        if f0 is None:
+            print(f"[SKIP] no drive frequency in name: {name}")
+            continue
+        n = min(len(cond), len(defl))
+        amp, ph = lockin(np.vstack([cond[:n], defl[:n]]), fs, f0, harmonics)
+        # harmonics at round-off level carry no gain
+        floor = 1e-9 * amp[1].max()
+        for k, h in enumerate(harmonics):
+            lag = np.angle(np.exp(1j * (ph[0, k] - ph[1, k])))
+            rows.append({"Name": name, "Device": dev, "Pressure (bar)": bar,
+                         "Harmonic": h, "Frequency (Hz)": h * f0,
+                         "Conductance Amp (mS)": amp[0, k],
+                         "Deflection Amp (px)": amp[1, k],
+                         "Gain (mS/px)": amp[0, k] / amp[1, k] if amp[1, k] > floor else np.nan,
+                         "Phase Lag (deg)": np.degrees(lag)})
+    return pd.DataFrame(rows)
@@ -1,8 +1,15 @@
+import os
+import sys
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import find_peaks
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Mask Code + GDS"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Pressure actuation videos + codes"))
+from calibration import load_calibration
+from framesource import FrameSource
+
 # === Configuration ===
 VIDEO_PATH = "G:/Beads tracking video for flow rate measurment.mp4"
 OUTPUT_VIDEO_PATH = "G:/tracked_video.mp4"
@@ -10,15 +17,24 @@ OUTPUT_VIDEO_PATH = "G:/tracked_video.mp4"
 # === Physical Constant ===
 PIXEL_TO_UM = 0.174  # µm/pixel for 4.5X magnification
 
+# Layout registration from Mask Code + GDS/calibrate.py replaces the nominal value
+calibration = load_calibration(VIDEO_PATH)
+if calibration:
+    PIXEL_TO_UM = calibration["um_per_px"]
+    print(f"Using calibrated scale: {PIXEL_TO_UM:.4f} µm/pixel")
+
 # === Open Video ===
-cap = cv2.VideoCapture(VIDEO_PATH)
-if not cap.isOpened():
-    raise FileNotFoundError(f"❌ Cannot open video file: {VIDEO_PATH}")
+src = FrameSource(VIDEO_PATH, gray=False)
+frames = iter(src)
+fps = src.fps
+
+# === Read First Frame ===
+_, first_frame = next(frames, (None, None))
+if first_frame is None:
+    raise ValueError("❌ Cannot read the first frame of the video")
 
-# === Video Properties ===
-fps = cap.get(cv2.CAP_PROP_FPS)
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+prev_gray = cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY)
+frame_height, frame_width = first_frame.shape[:2]
 
 # === Output Video Writer ===
 fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -27,27 +43,16 @@ out = cv2.VideoWriter(OUTPUT_VIDEO_PATH, fourcc, fps, (frame_width, frame_height
 # === Background Subtractor ===
 fgbg = cv2.createBackgroundSubtractorMOG2(history=100, varThreshold=50, detectShadows=False)
 
-# === Read First Frame ===
-ret, first_frame = cap.read()
-if not ret:
-    raise ValueError("❌ Cannot read the first frame of the video")
-
-prev_gray = cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY)
-
 # === Optical Flow Parameters ===
 lk_params = dict(winSize=(15, 15), maxLevel=2,
                  criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
 
 # === Velocity Tracking ===
 velocities_um_s = []
-frame_number = 0
-
-while True:
-    ret, next_frame = cap.read()
-    if not ret:
-        break
+next_gray = None
 
-    next_gray = cv2.cvtColor(next_frame, cv2.COLOR_BGR2GRAY)
+for frame_number, next_frame in frames:
+    next_gray = cv2.cvtColor(next_frame, cv2.COLOR_BGR2GRAY, dst=next_gray)
     fgmask = fgbg.apply(next_frame)
     fgmask = cv2.medianBlur(fgmask, 5)
 
@@ -77,10 +82,9 @@ while True:
             cv2.circle(next_frame, (int(a), int(b)), 5, (0, 0, 255), -1)
 
     out.write(next_frame)
-    prev_gray = next_gray.copy()
-    frame_number += 1
+    prev_gray, next_gray = next_gray, prev_gray  # swap buffers instead of copying
 
-cap.release()
+src.close()
 out.release()
 
 # === Sharpest 3 Peak Detection ===